@@ -1,19 +1,65 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from config.config import config
 from app.models import db
-from app.views import user_bp, post_bp, comment_bp, category_bp, tag_bp, like_bp
+from app.view_counter import view_counter
+from app.purge import purger
+from app.likes import like_queue
+from app.cache import cache
+from app.hashing import password_hasher
+from app.auth import jwt_auth
+from app.replicas import replica_router
+from app.migrations import check_schema
+from app.metrics import metrics
+from app.query_inspector import query_inspector
+from app.json_provider import FastJSONProvider
+from app.compression import compressor
+from app.views import user_bp, post_bp, comment_bp, category_bp, tag_bp, like_bp, batch_bp
 import os
 
-def create_app(config_name='development'):
+def create_app(config_name='development', schema_check=True):
     """Application factory"""
     app = Flask(__name__)
     
     # Load configuration
     app.config.from_object(config[config_name])
     
+    # Encode responses with orjson when available
+    app.json = FastJSONProvider(app)
+    
     # Initialize database
     db.init_app(app)
     
+    # gzip/brotli responses; initialized first so its after_request hook
+    # runs last and compresses the final body
+    compressor.init_app(app)
+    
+    # Route GET requests' reads to read replicas
+    replica_router.init_app(app)
+    
+    # Request latency, SQL, pool and cache metrics
+    metrics.init_app(app)
+    
+    # N+1, slow query and query budget checks (development and testing)
+    query_inspector.init_app(app)
+    
+    # Buffer post view increments and write them behind
+    view_counter.init_app(app)
+    
+    # Group-commit queued likes and unlikes (off unless LIKE_QUEUE_INTERVAL)
+    like_queue.init_app(app)
+    
+    # Remove soft-deleted users and posts in the background
+    purger.init_app(app)
+    
+    # Read-through cache for post, user and comment details
+    cache.init_app(app)
+    
+    # Password hashing off the request thread
+    password_hasher.init_app(app)
+    
+    # Stateless JWT access tokens
+    jwt_auth.init_app(app)
+    
     # Register blueprints
     app.register_blueprint(user_bp)
     app.register_blueprint(post_bp)
@@ -21,8 +67,13 @@ def create_app(config_name='development'):
     app.register_blueprint(category_bp)
     app.register_blueprint(tag_bp)
     app.register_blueprint(like_bp)
+    app.register_blueprint(batch_bp)
     
     # Error handlers
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({'error': error.description}), 400
+    
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({'error': 'Resource not found'}), 404
@@ -36,9 +87,20 @@ def create_app(config_name='development'):
     def health():
         return jsonify({'status': 'API is running'}), 200
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Cache counters for monitoring
+    @app.route('/api/cache/stats', methods=['GET'])
+    def cache_stats():
+        return jsonify(cache.stats()), 200
+    
+    # Prometheus metrics
+    @app.route('/api/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    
+    # Schema changes are applied by `flask db-upgrade`; only check the
+    # version here (management commands skip it so they can run that upgrade)
+    if schema_check:
+        check_schema(app)
     
     return app
 
@@ -0,0 +1,198 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+import jwt
+from flask import current_app, g, jsonify, request
+from app.models import db, RevokedToken
+
+SYNC_MARGIN = timedelta(minutes=1)
+# revoked_tokens rows with this jti prefix revoke every token a user was
+# issued up to revoked_at, rather than a single token
+USER_PREFIX = 'user:'
+# SECRET_KEY's fallback in config.py, only fit for development and tests
+DEV_SECRET_KEY = 'dev-secret-key'
+
+
+class JWTAuth:
+    """Issue and verify short-lived JWT access tokens.
+
+    Verification never touches the database: signing keys are parsed once
+    in init_app, and revoked token ids are kept in a per-process set that is
+    topped up from revoked_tokens at most every JWT_REVOCATION_SYNC_INTERVAL
+    seconds (tokens revoked in this process are rejected immediately).
+    Deleting a user revokes every token issued to them so far the same way.
+    """
+
+    def __init__(self, app=None):
+        self.algorithm = 'HS256'
+        self.ttl = 900
+        self.issuer = None
+        self.leeway = 0
+        self.sync_interval = 30
+        self._signing_key = None
+        self._verifying_key = None
+        self._revoked = {}
+        self._revoked_users = {}
+        self._watermark = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.algorithm = app.config.get('JWT_ALGORITHM', 'HS256')
+        self.ttl = app.config.get('JWT_ACCESS_TOKEN_TTL', 900)
+        self.issuer = app.config.get('JWT_ISSUER')
+        self.leeway = app.config.get('JWT_LEEWAY', 0)
+        self.sync_interval = app.config.get('JWT_REVOCATION_SYNC_INTERVAL', 30)
+        algorithm = jwt.get_algorithm_by_name(self.algorithm)
+        if self.algorithm.startswith('HS'):
+            secret = app.config.get('JWT_SECRET_KEY') or app.config['SECRET_KEY']
+            if secret == DEV_SECRET_KEY and not (app.debug or app.testing):
+                # Anyone could sign tokens with the published fallback
+                raise RuntimeError(
+                    'Refusing to sign JWTs with the development key: set JWT_SECRET_KEY or SECRET_KEY'
+                )
+            self._signing_key = self._verifying_key = algorithm.prepare_key(secret)
+        else:
+            private_key = app.config.get('JWT_PRIVATE_KEY')
+            self._signing_key = algorithm.prepare_key(private_key) if private_key else None
+            self._verifying_key = algorithm.prepare_key(app.config['JWT_PUBLIC_KEY'])
+        self._revoked = {}
+        self._revoked_users = {}
+        self._watermark = None
+        self._synced_at = None
+        app.extensions['jwt_auth'] = self
+
+    def issue(self, user):
+        """Return (token, expires_in) for a user"""
+        if self._signing_key is None:
+            raise RuntimeError('JWT_PRIVATE_KEY is not configured')
+        now = datetime.utcnow()
+        claims = {
+            'sub': str(user.id),
+            'username': user.username,
+            'iat': now,
+            'exp': now + timedelta(seconds=self.ttl),
+            'jti': uuid.uuid4().hex,
+        }
+        if self.issuer:
+            claims['iss'] = self.issuer
+        return jwt.encode(claims, self._signing_key, algorithm=self.algorithm), self.ttl
+
+    def verify(self, token):
+        """Decode a token, raising jwt.InvalidTokenError if it is invalid, expired or revoked"""
+        claims = jwt.decode(
+            token, self._verifying_key, algorithms=[self.algorithm],
+            issuer=self.issuer, leeway=self.leeway,
+            options={'require': ['sub', 'iat', 'exp', 'jti']}
+        )
+        if self.is_revoked(claims['jti']) or self._user_revoked(claims):
+            raise jwt.InvalidTokenError('Token has been revoked')
+        return claims
+
+    def revoke(self, claims):
+        """Revoke a decoded token until it expires"""
+        expires_at = datetime.utcfromtimestamp(claims['exp'])
+        with self._lock:
+            self._revoked[claims['jti']] = expires_at
+        try:
+            db.session.merge(RevokedToken(jti=claims['jti'], expires_at=expires_at))
+            # Expired tokens fail verification anyway
+            RevokedToken.query.filter(RevokedToken.expires_at < datetime.utcnow()).delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def revoke_user(self, user_id):
+        """Revoke every token issued to a user until now, in the current transaction.
+
+        The caller commits; until then only this process rejects the tokens.
+        """
+        now = datetime.utcnow()
+        # Tokens issued before now all expire by then
+        expires_at = now + timedelta(seconds=self.ttl + self.leeway)
+        with self._lock:
+            self._revoked_users[user_id] = (now, expires_at)
+        db.session.merge(RevokedToken(jti=f'{USER_PREFIX}{user_id}', expires_at=expires_at, revoked_at=now))
+
+    def is_revoked(self, jti):
+        """Whether a token id is on the (locally cached) revocation list"""
+        now = time.monotonic()
+        if self._synced_at is None or now - self._synced_at >= self.sync_interval:
+            self._sync(now)
+        with self._lock:
+            return jti in self._revoked
+
+    def _user_revoked(self, claims):
+        # Checked after is_revoked(), which keeps the list synced
+        with self._lock:
+            revoked = self._revoked_users.get(int(claims['sub']))
+        return revoked is not None and datetime.utcfromtimestamp(claims['iat']) <= revoked[0]
+
+    def _sync(self, now):
+        # Fetch only what was revoked since the last sync, and drop entries
+        # for tokens that have expired since
+        with self._lock:
+            if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+                return
+            self._synced_at = now
+            watermark = self._watermark
+        utcnow = datetime.utcnow()
+        stmt = db.select(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at).where(
+            RevokedToken.expires_at > utcnow
+        )
+        if watermark is not None:
+            # Re-read a margin before the watermark so revocations committed
+            # late, or stamped by a server with a lagging clock, are not missed
+            stmt = stmt.where(RevokedToken.revoked_at >= watermark - SYNC_MARGIN)
+        try:
+            rows = db.session.execute(stmt).all()
+        except Exception:
+            current_app.logger.exception('Failed to sync the token revocation list')
+            return
+        with self._lock:
+            for jti, expires_at, revoked_at in rows:
+                if jti.startswith(USER_PREFIX):
+                    self._revoked_users[int(jti[len(USER_PREFIX):])] = (revoked_at, expires_at)
+                else:
+                    self._revoked[jti] = expires_at
+                if self._watermark is None or revoked_at > self._watermark:
+                    self._watermark = revoked_at
+            if self._watermark is None:
+                self._watermark = utcnow
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > utcnow}
+            self._revoked_users = {
+                user_id: revoked for user_id, revoked in self._revoked_users.items() if revoked[1] > utcnow
+            }
+
+
+def _unauthorized(message):
+    response = jsonify({'error': message})
+    response.headers['WWW-Authenticate'] = 'Bearer'
+    return response, 401
+
+
+def auth_required(view):
+    """Require a valid Bearer access token; the caller's id is set as g.user_id"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return _unauthorized('Missing bearer token')
+        try:
+            claims = jwt_auth.verify(token.strip())
+            g.user_id = int(claims['sub'])
+        except (jwt.InvalidTokenError, ValueError) as e:
+            return _unauthorized(f'Invalid token: {e}')
+        g.token_claims = claims
+        return view(*args, **kwargs)
+    return wrapper
+
+
+jwt_auth = JWTAuth()
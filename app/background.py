@@ -0,0 +1,66 @@
+import atexit
+import os
+import threading
+
+
+class BackgroundWorker:
+    """Base for extensions that do their work on a background thread.
+
+    The thread calls run_once() every interval seconds, or as soon as
+    wake() is called, until stop(). It is started lazily by ensure_thread()
+    so each forked worker process gets its own; a thread inherited through
+    fork() is not running in the child. shutdown() is called at exit once
+    register_shutdown() has been.
+    """
+
+    thread_name = 'background'
+
+    def __init__(self):
+        self.interval = 0
+        self._thread = None
+        self._pid = None
+        self._thread_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._atexit_registered = False
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def shutdown(self):
+        """Stop the thread; subclasses also write out what they hold"""
+        self.stop()
+
+    def register_shutdown(self):
+        if not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+
+    def ensure_thread(self):
+        if self._running():
+            return
+        with self._thread_lock:
+            if self._running():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self.run_once()
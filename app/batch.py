@@ -0,0 +1,89 @@
+from flask import current_app, g, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from app.models import db
+
+# Response headers passed back for each sub-request
+FORWARDED_HEADERS = ('ETag', 'Last-Modified', 'Location', 'X-Query-Count')
+# Endpoint of the batch view, which sub-requests may not route to
+BATCH_ENDPOINT = 'batch.run_batch'
+# Environ flag marking a sub-request, so a batch view reached anyway refuses to run
+SUB_REQUEST_KEY = 'sosmed.batch_sub_request'
+
+
+def dispatch(sub_requests):
+    """Run API requests one after another within the current request.
+
+    Each sub-request is an object with a path (query string included), an
+    optional method (GET) and an optional JSON body, and carries the
+    Authorization header and cookies of the batch itself. They go through
+    the regular blueprints, hooks and error handlers, but share the batch's
+    application context and so its database session: reads after a write
+    see it, and once a sub-request writes the rest stay on the primary.
+    Returns a {status, headers, body} result per sub-request, in order;
+    raises ValueError for a malformed sub-request before running any.
+    """
+    builders = []
+    try:
+        for index, sub in enumerate(sub_requests):
+            if not isinstance(sub, dict) or not isinstance(sub.get('path'), str) or not sub['path'].startswith('/'):
+                raise ValueError(f'Request {index} needs an absolute path')
+            builder = _builder(sub)
+            builders.append(builder)
+            if _endpoint(builder) == BATCH_ENDPOINT:
+                raise ValueError(f'Request {index} is a batch; batches cannot be nested')
+        return [_run(builder) for builder in builders]
+    finally:
+        for builder in builders:
+            builder.close()
+
+
+def _builder(sub):
+    headers = {name: request.headers[name] for name in ('Authorization', 'Cookie') if name in request.headers}
+    return EnvironBuilder(
+        path=sub['path'], method=str(sub.get('method', 'GET')).upper(), json=sub.get('body'),
+        headers=headers, base_url=request.host_url,
+        environ_base={'REMOTE_ADDR': request.remote_addr, SUB_REQUEST_KEY: True}
+    )
+
+
+def _endpoint(builder):
+    """The endpoint a sub-request routes to, resolved as the app will (percent-decoding included)"""
+    adapter = current_app.url_map.bind_to_environ(builder.get_environ())
+    try:
+        endpoint, _ = adapter.match()
+    except HTTPException:
+        # Not found, wrong method or a redirect: the sub-request answers that
+        return None
+    return endpoint
+
+
+def in_batch():
+    """Whether the current request is a sub-request of a batch"""
+    return bool(request.environ.get(SUB_REQUEST_KEY))
+
+
+def _run(builder):
+    app = current_app._get_current_object()
+    # g belongs to the shared application context; give each sub-request a
+    # clean one so its hooks and auth do not clobber the batch's
+    saved = dict(vars(g))
+    vars(g).clear()
+    try:
+        with app.request_context(builder.get_environ()):
+            try:
+                response = app.full_dispatch_request()
+            except Exception as e:
+                db.session.rollback()
+                response = app.make_response(app.handle_exception(e))
+            if response.is_streamed:
+                response.close()
+                return {'status': 400, 'headers': {}, 'body': {'error': 'Streaming endpoints cannot be batched'}}
+            return {
+                'status': response.status_code,
+                'headers': {name: response.headers[name] for name in FORWARDED_HEADERS if name in response.headers},
+                'body': response.get_json(silent=True)
+            }
+    finally:
+        vars(g).clear()
+        vars(g).update(saved)
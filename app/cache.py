@@ -0,0 +1,224 @@
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class CacheBackend:
+    """Storage interface used by Cache.
+
+    Values are JSON-serializable payloads; ttl is in seconds.
+    """
+
+    evictions = 0
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        return 0
+
+
+class NullBackend(CacheBackend):
+    """Backend that stores nothing, disabling caching"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUBackend(CacheBackend):
+    """In-process LRU cache bounded by entry count, with per-entry TTL"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend(CacheBackend):
+    """Backend over a Redis client, or anything with the same get/set/delete calls.
+
+    Unlike the in-process LRU, invalidations are seen by every worker.
+    """
+
+    def __init__(self, client, prefix='sosmed:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [json.loads(raw) if raw is not None else None for raw in self.client.mget([self.prefix + key for key in keys])]
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class Cache:
+    """Read-through cache for serialized resources.
+
+    Controllers look payloads up by key ('post:1', 'user:3', ...) and
+    delete those keys on every write that changes them. Values handed out
+    are shared with the backend and must not be mutated.
+
+    A payload that embeds another resource (a post shows its author's
+    username) is set with depends_on naming it ('user:3'), and stops being
+    served once bump('user:3') is called, however many payloads that is.
+    Each name has a generation token cached under 'gen:<name>'; a value is
+    stored with the tokens current when it was set, and bump() drops the
+    token so the next lookup starts a new one.
+
+    The LRU backend lives in each worker process: a write only invalidates
+    the copies in the process that made it, and the others serve theirs
+    until CACHE_DEFAULT_TTL runs out. Deployments with more than one worker
+    that need writes to show up at once use the Redis backend.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.default_ttl = 0
+        self.hits = 0
+        self.misses = 0
+        # Request threads look values up concurrently
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'lru')
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 60)
+        if cache_type == 'lru':
+            self.backend = LRUBackend(app.config.get('CACHE_MAX_ENTRIES', 10000))
+        elif cache_type == 'redis':
+            import redis
+            self.backend = RedisBackend(redis.Redis.from_url(app.config['CACHE_REDIS_URL']))
+        elif cache_type == 'null':
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f'Unknown CACHE_TYPE: {cache_type}')
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+        app.extensions['cache'] = self
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if entry is not None and entry[1] and self._generations(entry[1]) != entry[1]:
+            entry = None
+        with self._stats_lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if entry is None else entry[0]
+
+    def set(self, key, value, ttl=None, depends_on=()):
+        self.backend.set(key, [value, self._generations(depends_on)], self.default_ttl if ttl is None else ttl)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def bump(self, *names):
+        """Invalidate every value set as depending on one of names"""
+        self.backend.delete(*(f'gen:{name}' for name in names))
+
+    def _generations(self, names):
+        """The current generation token of each name, starting the missing ones"""
+        names = list(dict.fromkeys(names))
+        tokens = self.backend.get_many([f'gen:{name}' for name in names])
+        for i, token in enumerate(tokens):
+            if token is None:
+                tokens[i] = uuid.uuid4().hex
+                # Outlives the values depending on it; if it goes first,
+                # they are only refetched early
+                self.backend.set(f'gen:{names[i]}', tokens[i], self.default_ttl * 10)
+        return dict(zip(names, tokens))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'evictions': self.backend.evictions,
+            'size': len(self.backend)
+        }
+
+
+cache = Cache()
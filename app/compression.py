@@ -0,0 +1,94 @@
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip is offered without it
+    brotli = None
+
+
+class Compressor:
+    """Negotiated gzip or brotli compression of responses.
+
+    A response is compressed when the client accepts one of the encodings
+    (brotli is preferred if installed and equally acceptable), its mimetype
+    is in COMPRESSION_MIMETYPES and its body is at least
+    COMPRESSION_MIN_SIZE bytes. Streamed responses, like the NDJSON
+    exports, are compressed chunk by chunk as they are sent, so they keep
+    running in constant memory. COMPRESSION_LEVEL (gzip, 1-9) and
+    COMPRESSION_BROTLI_QUALITY (0-11) trade CPU for bandwidth.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.min_size = 500
+        self.level = 6
+        self.brotli_quality = 4
+        self.mimetypes = ()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESSION_ENABLED', True)
+        self.min_size = app.config.get('COMPRESSION_MIN_SIZE', 500)
+        self.level = app.config.get('COMPRESSION_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESSION_BROTLI_QUALITY', 4)
+        self.mimetypes = tuple(app.config.get('COMPRESSION_MIMETYPES', ('application/json',)))
+        app.extensions['compressor'] = self
+        if self.enabled:
+            app.after_request(self._after_request)
+
+    def encodings(self):
+        """Content codings this process can produce, most preferred first"""
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def _compressor(self, encoding):
+        """The (compress, finish) functions of a new compression stream"""
+        if encoding == 'br':
+            stream = brotli.Compressor(quality=self.brotli_quality)
+            return stream.process, stream.finish
+        # wbits 31: a deflate stream with a gzip header and trailer
+        stream = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return stream.compress, stream.flush
+
+    def _after_request(self, response):
+        if (
+            response.mimetype not in self.mimetypes
+            or not 200 <= response.status_code < 300
+            or response.status_code in (204, 206)
+            or 'Content-Encoding' in response.headers
+        ):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings())
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, *self._compressor(encoding))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            compress, finish = self._compressor(encoding)
+            response.set_data(compress(data) + finish())
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compress_stream(self, chunks, compress, finish):
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                output = compress(chunk)
+                # Small chunks are buffered until a block is full
+                if output:
+                    yield output
+            yield finish()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+
+compressor = Compressor()
@@ -0,0 +1,65 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import current_app, make_response, request
+
+
+def make_etag(data):
+    """Hash a payload's bytes into an opaque entity tag"""
+    return hashlib.sha1(data).hexdigest()
+
+
+def conditional(ignore=(), trust_modified_since=True):
+    """Add ETag/Last-Modified to a GET view and answer 304 when they match.
+
+    The entity tag is a hash of the JSON payload the view served, so it
+    costs no extra queries and always describes what the client actually
+    received, whether it came from the database or the cache. Top-level
+    fields in ignore, which change on every read (a post's views_count),
+    are left out of it. The view always runs and its payload is always
+    serialized, so its side effects happen on a 304 too: a 304 saves
+    bandwidth, not server work.
+
+    Resources whose payload holds only their own columns get Last-Modified
+    from their updated_at and honour If-Modified-Since. Everything else
+    passes trust_modified_since=False and only honours If-None-Match: a
+    list's max updated_at does not move when a row is deleted, and a
+    payload embedding another row (a comment's author) changes when that
+    row does.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            etag = None
+            last_modified = None
+            if ignore or trust_modified_since:
+                payload = response.get_json(silent=True)
+                if isinstance(payload, dict):
+                    if ignore:
+                        payload = {k: v for k, v in payload.items() if k not in ignore}
+                        etag = make_etag(current_app.json.dumps(payload).encode())
+                    if trust_modified_since and payload.get('updated_at'):
+                        # HTTP dates carry whole seconds
+                        last_modified = datetime.fromisoformat(payload['updated_at']).replace(microsecond=0)
+            if etag is None:
+                etag = make_etag(response.get_data())
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif trust_modified_since and request.if_modified_since and last_modified is not None:
+                not_modified = last_modified <= request.if_modified_since.replace(tzinfo=None)
+            else:
+                not_modified = False
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            # Weak: equal payloads may differ in encoding (e.g. compression)
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
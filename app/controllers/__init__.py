@@ -1,7 +1,193 @@
-from app.models import db, User, Post, Comment, Category, Tag, Like
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask import jsonify
+from app.models import db, User, Post, Comment, Category, Tag, Like, post_tags
+from app.pagination import keyset_paginate
+from app.view_counter import view_counter
+from app.cache import cache
+from app.hashing import password_hasher, HasherBusy
+from app.auth import jwt_auth
+from app.search import index_posts, remove_posts, search_post_ids, SearchNotSupported
+from app import trending
+from app import likes
+from app.likes import like_queue
+from flask import jsonify, current_app
 from datetime import datetime
+import json
+
+
+def _get_many(query, model, ids, serialize, cache_prefix=None, depends_on=None):
+    """Serialize the rows of a multi-get in the order of ids, fetching them with one IN query.
+
+    With cache_prefix, rows in the read-through cache are served from it and
+    only the others are queried (and cached, depending on what
+    depends_on(row) names). Returns the payloads and the ids that were not
+    found.
+    """
+    found = {}
+    if cache_prefix:
+        for row_id in ids:
+            data = cache.get(f'{cache_prefix}:{row_id}')
+            if data is not None:
+                found[row_id] = data
+    missing = [row_id for row_id in ids if row_id not in found]
+    if missing:
+        for row in query.filter(model.id.in_(missing)):
+            found[row.id] = serialize(row)
+            if cache_prefix:
+                cache.set(f'{cache_prefix}:{row.id}', found[row.id], depends_on=depends_on(row) if depends_on else ())
+    return [found[row_id] for row_id in ids if row_id in found], [row_id for row_id in ids if row_id not in found]
+
+
+def _adjust_post_counter(post_id, column, delta):
+    """Atomically add delta to one of a post's denormalized counters"""
+    Post.query.filter_by(id=post_id).update(
+        {column: db.func.coalesce(column, 0) + delta, Post.updated_at: Post.updated_at},
+        synchronize_session=False
+    )
+
+
+def _server_error(e):
+    """Log an unexpected error and answer 500 without its details"""
+    current_app.logger.error('Unexpected error', exc_info=e)
+    return {'error': 'Internal server error'}, 500
+
+
+# What the field types of FIELD_TYPES are called in error messages
+_TYPE_NAMES = {str: 'a string', int: 'an integer', list: 'a list'}
+
+
+def _field_error(data, required, types):
+    """Why data cannot be stored, or None.
+
+    Required fields must be set and neither null nor blank, and every field
+    given must have its type in types (an int is never a bool).
+    """
+    for field in required:
+        value = data.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return f'{field} is required'
+    for field, kind in types.items():
+        value = data.get(field)
+        if value is not None and (not isinstance(value, kind) or (kind is int and isinstance(value, bool))):
+            return f'{field} must be {_TYPE_NAMES[kind]}'
+    return None
+
+
+def _validate_required(items, fields, types):
+    """Check each bulk item is an object with the required fields, of the right types.
+
+    Returns per-item results (None where the item passed) and the
+    (index, item) pairs still to be validated.
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not all(k in item for k in fields):
+            _reject(results, index, 'Missing required fields')
+        else:
+            error = _field_error(item, fields, types)
+            if error:
+                _reject(results, index, error)
+            else:
+                valid.append((index, item))
+    return results, valid
+
+
+def _reject(results, index, error, status=400):
+    """Record a failed bulk item"""
+    results[index] = {'index': index, 'status': status, 'error': error}
+
+
+def _bulk_insert(model, rows, results, before_commit=None):
+    """Insert validated (index, row) pairs with executemany and fill in their results.
+
+    Rows are written in chunks of BULK_CHUNK_SIZE, each in its own
+    transaction (0 writes everything in one). before_commit is called with
+    each chunk's rows and new ids inside its transaction. When a chunk
+    fails, its rows are retried one per transaction, so only the rows that
+    fail on their own are reported as failed. Returns the rows committed.
+    """
+    chunk_size = current_app.config.get('BULK_CHUNK_SIZE') or len(rows) or 1
+    committed = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            committed.extend(_insert_chunk(model, chunk, results, before_commit))
+            continue
+        except Exception as e:
+            current_app.logger.warning('Bulk insert of %d %s rows failed, retrying them one by one: %s',
+                                       len(chunk), model.__tablename__, e)
+        for row in chunk:
+            try:
+                committed.extend(_insert_chunk(model, [row], results, before_commit))
+            except Exception as e:
+                current_app.logger.error('Bulk insert of a %s row failed', model.__tablename__, exc_info=e)
+                _reject(results, row[0], 'Could not save this item', 500)
+    return committed
+
+
+def _insert_chunk(model, chunk, results, before_commit):
+    """Insert and commit (index, row) pairs in one transaction, filling in their results"""
+    params = [row for _, row in chunk]
+    # Only some dialects (not MySQL) report generated keys for executemany
+    returning = db.engine.dialect.insert_executemany_returning_sort_by_parameter_order
+    try:
+        if returning:
+            stmt = db.insert(model).returning(model.id, sort_by_parameter_order=True)
+            ids = db.session.execute(stmt, params).scalars().all()
+        else:
+            db.session.execute(db.insert(model), params)
+            ids = [None] * len(chunk)
+        if before_commit:
+            before_commit(params, ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for (index, _), new_id in zip(chunk, ids):
+        results[index] = {'index': index, 'status': 201, 'id': new_id}
+    return params
+
+
+def _bulk_response(results):
+    """Summarize per-item results: 201 when all were created, 207 otherwise"""
+    created = sum(1 for r in results if r['status'] == 201)
+    return {
+        'results': results,
+        'created': created,
+        'failed': len(results) - created
+    }, 201 if created == len(results) else 207
+
+
+def _check_bulk_size(items):
+    """Error response for an oversized batch, or None"""
+    limit = current_app.config.get('BULK_MAX_ITEMS', 5000)
+    if len(items) > limit:
+        return {'error': f'At most {limit} items per request'}, 413
+    return None
+
+
+def _export_rows(model, since_column, since=None):
+    """Yield a table's rows as NDJSON lines in primary key order.
+
+    Rows come straight off a server-side cursor in batches of
+    EXPORT_BATCH_SIZE as plain mappings, so memory stays flat however large
+    the table is. since keeps only rows with since_column at or after it.
+    """
+    table = model.__table__
+    stmt = db.select(table).order_by(table.c.id)
+    if since is not None:
+        stmt = stmt.where(since_column >= since)
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for row in result.mappings():
+        yield json.dumps(dict(row), default=_json_default) + '\n'
+
+
+def _json_default(value):
+    """Encode the datetimes json.dumps cannot"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
 
 class UserController:
     """Handle user-related operations"""
@@ -19,28 +205,44 @@ class UserController:
             user = User(
                 username=data.get('username'),
                 email=data.get('email'),
-                password=generate_password_hash(data.get('password')),
+                password=password_hasher.hash(data.get('password')),
                 full_name=data.get('full_name')
             )
             db.session.add(user)
             db.session.commit()
             return user.to_dict(), 201
+        except HasherBusy:
+            db.session.rollback()
+            return {'error': 'Server is busy, try again shortly'}, 503
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
     
     @staticmethod
     def get_user(user_id):
         """Get user by ID"""
-        user = User.query.get(user_id)
-        if not user:
-            return {'error': 'User not found'}, 404
-        return user.to_dict(), 200
+        data = cache.get(f'user:{user_id}')
+        if data is None:
+            user = User.query.filter_by(id=user_id, deleted_at=None).first()
+            if not user:
+                return {'error': 'User not found'}, 404
+            data = user.to_dict()
+            cache.set(f'user:{user_id}', data)
+        return data, 200
     
     @staticmethod
-    def get_all_users(page=1, per_page=10):
+    def get_all_users(page=1, per_page=10, cursor=None):
         """Get all users with pagination"""
-        pagination = User.query.paginate(page=page, per_page=per_page)
+        if cursor is not None:
+            try:
+                users, next_cursor = keyset_paginate(User.query.filter_by(deleted_at=None), User, cursor, per_page)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            return {
+                'users': [u.to_dict() for u in users],
+                'next_cursor': next_cursor
+            }, 200
+        pagination = User.query.filter_by(deleted_at=None).paginate(page=page, per_page=per_page)
         return {
             'users': [u.to_dict() for u in pagination.items],
             'total': pagination.total,
@@ -48,15 +250,22 @@ class UserController:
             'current_page': page
         }, 200
     
+    @staticmethod
+    def get_users(ids):
+        """Get several users by ID"""
+        users, missing = _get_many(User.query.filter_by(deleted_at=None), User, ids, User.to_dict, 'user')
+        return {'users': users, 'missing': missing}, 200
+    
     @staticmethod
     def update_user(user_id, data):
         """Update user information"""
         try:
-            user = User.query.get(user_id)
+            user = User.query.filter_by(id=user_id, deleted_at=None).first()
             if not user:
                 return {'error': 'User not found'}, 404
             
-            if 'username' in data and data['username'] != user.username:
+            renamed = 'username' in data and data['username'] != user.username
+            if renamed:
                 if User.query.filter_by(username=data['username']).first():
                     return {'error': 'Username already exists'}, 400
                 user.username = data['username']
@@ -70,45 +279,143 @@ class UserController:
                 user.full_name = data['full_name']
             
             if 'password' in data:
-                user.password = generate_password_hash(data['password'])
+                user.password = password_hasher.hash(data['password'])
             
             user.updated_at = datetime.utcnow()
             db.session.commit()
+            cache.delete(f'user:{user_id}')
+            if renamed:
+                # Cached posts and comments show the old username
+                cache.bump(f'user:{user_id}')
             return user.to_dict(), 200
+        except HasherBusy:
+            db.session.rollback()
+            return {'error': 'Server is busy, try again shortly'}, 503
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
     
     @staticmethod
     def delete_user(user_id):
-        """Delete a user"""
+        """Delete a user with their posts, comments and likes.
+        
+        With SOFT_DELETE the user, their posts and their comments are hidden
+        here and the purge job removes the rows in chunks; otherwise the
+        database cascades the delete within this request. Either way every
+        token issued to them is revoked.
+        """
         try:
-            user = User.query.get(user_id)
+            user = User.query.filter_by(id=user_id, deleted_at=None).first()
             if not user:
                 return {'error': 'User not found'}, 404
+            soft = current_app.config.get('SOFT_DELETE')
+            
+            # Everything cached or indexed that the delete hides, removes or changes
+            own_posts = db.select(Post.id).where(Post.user_id == user_id)
+            own_post_ids = db.session.scalars(own_posts).all()
+            remove_posts(own_post_ids)
+            trending.forget(own_post_ids)
+            stale_posts = db.session.scalars(db.union(
+                own_posts,
+                db.select(Like.post_id).where(Like.user_id == user_id),
+                db.select(Comment.post_id).where(Comment.user_id == user_id)
+            )).all()
+            stale_comments = db.session.scalars(db.select(Comment.id).where(
+                db.or_(Comment.user_id == user_id, Comment.post_id.in_(own_posts))
+            )).all()
             
-            db.session.delete(user)
+            # The user's comments go (or are hidden) with them, and without
+            # SOFT_DELETE their likes too; take them off the counters of the
+            # posts they were on. The purge recounts what it deletes.
+            own_comments = db.select(db.func.count(Comment.id)).where(
+                Comment.post_id == Post.id, Comment.user_id == user_id, Comment.is_approved.is_(True)
+            ).scalar_subquery()
+            commented = db.select(Comment.post_id).where(Comment.user_id == user_id)
+            Post.query.filter(Post.id.in_(commented)).update(
+                {Post.comments_count: Post.comments_count - own_comments, Post.updated_at: Post.updated_at},
+                synchronize_session=False
+            )
+            if not soft:
+                liked = db.select(Like.post_id).where(Like.user_id == user_id)
+                Post.query.filter(Post.id.in_(liked)).update(
+                    {Post.likes_count: Post.likes_count - 1, Post.updated_at: Post.updated_at},
+                    synchronize_session=False
+                )
+            
+            jwt_auth.revoke_user(user_id)
+            if soft:
+                now = datetime.utcnow()
+                user.deleted_at = now
+                Post.query.filter_by(user_id=user_id).update(
+                    {Post.deleted_at: now, Post.updated_at: Post.updated_at}, synchronize_session=False
+                )
+            else:
+                db.session.delete(user)
             db.session.commit()
+            cache.delete(
+                f'user:{user_id}',
+                *(f'post:{post_id}' for post_id in stale_posts),
+                *(f'comment:{comment_id}' for comment_id in stale_comments)
+            )
+            if soft:
+                current_app.extensions['purger'].schedule()
             return {'message': 'User deleted successfully'}, 200
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
     
     @staticmethod
     def login(username, password):
         """Verify user credentials"""
-        user = User.query.filter_by(username=username).first()
-        if not user or not check_password_hash(user.password, password):
-            return {'error': 'Invalid username or password'}, 401
-        return user.to_dict(), 200
+        user = User.query.filter_by(username=username, deleted_at=None).first()
+        try:
+            if not user or not password_hasher.verify(user.password, password):
+                return {'error': 'Invalid username or password'}, 401
+        except HasherBusy:
+            return {'error': 'Server is busy, try again shortly'}, 503
+        
+        result = user.to_dict()
+        result['access_token'], result['expires_in'] = jwt_auth.issue(user)
+        result['token_type'] = 'Bearer'
+        if password_hasher.needs_rehash(user.password):
+            # The hash cost changed since this password was set; upgrade it
+            # now that we have the plaintext. Best effort: a busy pool or a
+            # failed write just leaves the old hash for the next login.
+            try:
+                User.query.filter_by(id=user.id).update(
+                    {User.password: password_hasher.hash(password), User.updated_at: User.updated_at},
+                    synchronize_session=False
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+        return result, 200
+    
+    @staticmethod
+    def logout(claims):
+        """Revoke an access token"""
+        try:
+            jwt_auth.revoke(claims)
+            return {'message': 'Logged out successfully'}, 200
+        except Exception as e:
+            return _server_error(e)
 
 
 class PostController:
     """Handle post-related operations"""
     
+    REQUIRED_FIELDS = ('title', 'content', 'user_id')
+    FIELD_TYPES = {'title': str, 'content': str, 'user_id': int, 'category_id': int, 'status': str, 'tag_ids': list}
+    FIELDS = Post.FIELDS
+    
     @staticmethod
     def create_post(data, user_id):
         """Create a new post"""
+        error = _field_error(dict(data, user_id=user_id), PostController.REQUIRED_FIELDS, PostController.FIELD_TYPES)
+        if error is None and not all(isinstance(i, int) and not isinstance(i, bool) for i in data.get('tag_ids') or []):
+            error = 'tag_ids must be a list of integers'
+        if error:
+            return {'error': error}, 400
         try:
             post = Post(
                 title=data.get('title'),
@@ -117,35 +424,163 @@ class PostController:
                 category_id=data.get('category_id'),
                 status=data.get('status', 'draft')
             )
+            if data.get('tag_ids'):
+                post.tags = Tag.query.filter(Tag.id.in_(data['tag_ids'])).all()
             db.session.add(post)
+            db.session.flush()
+            if post.tags:
+                Post.sync_tag_links([post.id])
+            index_posts([(post.id, post.title, post.content)])
             db.session.commit()
             return post.to_dict(), 201
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
+    
+    @staticmethod
+    def bulk_create_posts(items):
+        """Validate and insert many posts, reporting a result per item"""
+        error = _check_bulk_size(items)
+        if error:
+            return error
+        results, valid = _validate_required(items, PostController.REQUIRED_FIELDS, PostController.FIELD_TYPES)
+        user_ids = {item['user_id'] for _, item in valid}
+        category_ids = {item['category_id'] for _, item in valid if item.get('category_id') is not None}
+        known_users = set(db.session.scalars(
+            db.select(User.id).where(User.id.in_(user_ids), User.deleted_at.is_(None))
+        ))
+        known_categories = set(db.session.scalars(db.select(Category.id).where(Category.id.in_(category_ids))))
+        
+        now = datetime.utcnow()
+        rows = []
+        for index, item in valid:
+            if item['user_id'] not in known_users:
+                _reject(results, index, 'User not found', 404)
+            elif item.get('category_id') is not None and item['category_id'] not in known_categories:
+                _reject(results, index, 'Category not found', 404)
+            else:
+                rows.append((index, {
+                    'title': item['title'],
+                    'content': item['content'],
+                    'user_id': item['user_id'],
+                    'category_id': item.get('category_id'),
+                    'status': item.get('status', 'draft'),
+                    'views_count': 0,
+                    'likes_count': 0,
+                    'comments_count': 0,
+                    'created_at': now,
+                    'updated_at': now
+                }))
+        
+        def index_new_posts(params, ids):
+            index_posts([(post_id, row['title'], row['content']) for row, post_id in zip(params, ids)])
+        
+        _bulk_insert(Post, rows, results, before_commit=index_new_posts)
+        return _bulk_response(results)
+    
+    @staticmethod
+    def _embedded_comments(post_id):
+        """Query of the approved comments shown on a post's detail, newest first"""
+        return Comment.query.filter_by(post_id=post_id, is_approved=True)
+    
+    @staticmethod
+    def _cache_dependencies(post, comments):
+        """Names of the users and category whose names a cached post detail shows"""
+        names = [f'user:{post.user_id}', *(f'user:{c.user_id}' for c in comments)]
+        if post.category_id is not None:
+            names.append(f'category:{post.category_id}')
+        return names
     
     @staticmethod
     def get_post(post_id):
-        """Get post by ID"""
-        post = Post.query.get(post_id)
-        if not post:
-            return {'error': 'Post not found'}, 404
-        post.views_count += 1
-        db.session.commit()
-        return post.to_dict(include_comments=True), 200
+        """Get post by ID with its newest approved comments.
+
+        Only POST_DETAIL_COMMENTS comments are embedded, whatever the size
+        of the thread; comments_next_cursor continues from the last of them
+        at /api/comments/post/<post_id>.
+        """
+        data = cache.get(f'post:{post_id}')
+        if data is None:
+            post = Post.query.options(*Post.load_options()).get(post_id)
+            if not post:
+                return {'error': 'Post not found'}, 404
+            comments, next_cursor = keyset_paginate(
+                PostController._embedded_comments(post_id).options(*Comment.load_options()),
+                Comment, '', current_app.config['POST_DETAIL_COMMENTS']
+            )
+            data = dict(
+                post.to_dict(),
+                comments=[c.to_dict() for c in comments],
+                comments_next_cursor=next_cursor
+            )
+            cache.set(f'post:{post_id}', data, depends_on=PostController._cache_dependencies(post, comments))
+        # Views are buffered and written behind, keeping this a pure read;
+        # the payload counts this view and any still buffered
+        data = dict(data, views_count=(data['views_count'] or 0) + view_counter.pending(post_id) + 1)
+        view_counter.record(post_id)
+        return data, 200
     
     @staticmethod
-    def get_all_posts(page=1, per_page=10, status='published'):
+    def get_all_posts(page=1, per_page=10, status='published', cursor=None, fields=None):
         """Get all posts with pagination"""
-        query = Post.query.filter_by(status=status)
+        query = Post.query.options(*Post.load_options(fields=fields)).filter_by(status=status)
+        if cursor is not None:
+            try:
+                posts, next_cursor = keyset_paginate(query, Post, cursor, per_page)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            return {
+                'posts': [p.to_dict(fields=fields) for p in posts],
+                'next_cursor': next_cursor
+            }, 200
         pagination = query.paginate(page=page, per_page=per_page)
         return {
-            'posts': [p.to_dict() for p in pagination.items],
+            'posts': [p.to_dict(fields=fields) for p in pagination.items],
             'total': pagination.total,
             'pages': pagination.pages,
             'current_page': page
         }, 200
     
+    @staticmethod
+    def get_posts(ids, fields=None):
+        """Get several posts by ID, without their comments"""
+        query = Post.query.options(*Post.load_options(fields=fields))
+        posts, missing = _get_many(query, Post, ids, lambda p: p.to_dict(fields=fields))
+        return {'posts': posts, 'missing': missing}, 200
+    
+    @staticmethod
+    def search_posts(q, page=1, per_page=10, status='published', fields=None):
+        """Full-text search over post titles and content, best match first"""
+        if page < 1:
+            return {'error': 'Invalid page'}, 400
+        try:
+            post_ids = search_post_ids(q, status, per_page, (page - 1) * per_page)
+        except SearchNotSupported as e:
+            return {'error': str(e)}, 501
+        posts = {p.id: p for p in Post.query.options(*Post.load_options(fields=fields)).filter(Post.id.in_(post_ids))}
+        return {
+            'posts': [posts[post_id].to_dict(fields=fields) for post_id in post_ids if post_id in posts],
+            'query': q,
+            'current_page': page
+        }, 200
+    
+    @staticmethod
+    def get_trending_posts(page=1, per_page=10, status='published', fields=None):
+        """Get posts ranked by time-decayed likes, comments and views"""
+        if page < 1:
+            return {'error': 'Invalid page'}, 400
+        post_ids = trending.top_post_ids(per_page, (page - 1) * per_page, status)
+        posts = {p.id: p for p in Post.query.options(*Post.load_options(fields=fields)).filter(Post.id.in_(post_ids))}
+        return {
+            'posts': [posts[post_id].to_dict(fields=fields) for post_id in post_ids if post_id in posts],
+            'current_page': page
+        }, 200
+    
+    @staticmethod
+    def export_posts(since=None):
+        """Stream every post (updated at or after since) as NDJSON"""
+        return _export_rows(Post, Post.updated_at, since)
+    
     @staticmethod
     def update_post(post_id, data, user_id):
         """Update a post"""
@@ -165,13 +600,21 @@ class PostController:
                 post.category_id = data['category_id']
             if 'status' in data:
                 post.status = data['status']
+            if 'tag_ids' in data:
+                post.tags = Tag.query.filter(Tag.id.in_(data['tag_ids'] or [])).all()
+            if 'title' in data or 'content' in data:
+                index_posts([(post.id, post.title, post.content)])
+            if 'status' in data or 'tag_ids' in data:
+                db.session.flush()
+                Post.sync_tag_links([post.id])
             
             post.updated_at = datetime.utcnow()
             db.session.commit()
+            cache.delete(f'post:{post_id}')
             return post.to_dict(), 200
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
     
     @staticmethod
     def delete_post(post_id, user_id):
@@ -184,20 +627,62 @@ class PostController:
             if post.user_id != user_id:
                 return {'error': 'Unauthorized'}, 403
             
+            if current_app.config.get('SOFT_DELETE'):
+                # Hidden from every query from here on; the purge job
+                # removes it with its comments and likes
+                post.deleted_at = datetime.utcnow()
+                remove_posts([post_id])
+                trending.forget([post_id])
+                db.session.commit()
+                cache.delete(f'post:{post_id}')
+                current_app.extensions['purger'].schedule()
+                return {'message': 'Post deleted successfully'}, 200
+            
+            comment_ids = db.session.scalars(db.select(Comment.id).where(Comment.post_id == post_id)).all()
+            remove_posts([post_id])
+            trending.forget([post_id])
             db.session.delete(post)
             db.session.commit()
+            cache.delete(f'post:{post_id}', *(f'comment:{comment_id}' for comment_id in comment_ids))
             return {'message': 'Post deleted successfully'}, 200
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
+    
+    @staticmethod
+    def recount_counters(post_ids=None):
+        """Recompute likes_count and comments_count of some posts, or of every post, in one statement"""
+        likes = db.select(db.func.count(Like.id)).where(Like.post_id == Post.id).scalar_subquery()
+        comments = db.select(db.func.count(Comment.id)).where(
+            Comment.post_id == Post.id, Comment.is_approved.is_(True)
+        ).scalar_subquery()
+        query = Post.query if post_ids is None else Post.query.filter(Post.id.in_(post_ids))
+        try:
+            updated = query.update(
+                {Post.likes_count: likes, Post.comments_count: comments, Post.updated_at: Post.updated_at},
+                synchronize_session=False
+            )
+            db.session.commit()
+            return updated
+        except Exception:
+            db.session.rollback()
+            raise
 
 
 class CommentController:
     """Handle comment-related operations"""
     
+    REQUIRED_FIELDS = ('content', 'post_id', 'user_id')
+    FIELD_TYPES = {'content': str, 'post_id': int, 'user_id': int}
+    
     @staticmethod
     def create_comment(data, user_id):
         """Create a new comment"""
+        error = _field_error(
+            dict(data, user_id=user_id), CommentController.REQUIRED_FIELDS, CommentController.FIELD_TYPES
+        )
+        if error:
+            return {'error': error}, 400
         try:
             comment = Comment(
                 content=data.get('content'),
@@ -205,24 +690,92 @@ class CommentController:
                 post_id=data.get('post_id')
             )
             db.session.add(comment)
+            _adjust_post_counter(comment.post_id, Post.comments_count, 1)
+            trending.record('comment', {comment.post_id: 1})
             db.session.commit()
+            cache.delete(f'post:{comment.post_id}')
             return comment.to_dict(), 201
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
+    
+    @staticmethod
+    def bulk_create_comments(items):
+        """Validate and insert many comments, reporting a result per item"""
+        error = _check_bulk_size(items)
+        if error:
+            return error
+        results, valid = _validate_required(items, CommentController.REQUIRED_FIELDS, CommentController.FIELD_TYPES)
+        user_ids = {item['user_id'] for _, item in valid}
+        post_ids = {item['post_id'] for _, item in valid}
+        known_users = set(db.session.scalars(
+            db.select(User.id).where(User.id.in_(user_ids), User.deleted_at.is_(None))
+        ))
+        known_posts = set(db.session.scalars(db.select(Post.id).where(Post.id.in_(post_ids))))
+        
+        now = datetime.utcnow()
+        rows = []
+        for index, item in valid:
+            if item['user_id'] not in known_users:
+                _reject(results, index, 'User not found', 404)
+            elif item['post_id'] not in known_posts:
+                _reject(results, index, 'Post not found', 404)
+            else:
+                rows.append((index, {
+                    'content': item['content'],
+                    'user_id': item['user_id'],
+                    'post_id': item['post_id'],
+                    'is_approved': True,
+                    'created_at': now,
+                    'updated_at': now
+                }))
+        
+        def count_comments(params, ids):
+            deltas = {}
+            for row in params:
+                deltas[row['post_id']] = deltas.get(row['post_id'], 0) + 1
+            Post.adjust_counters(Post.comments_count, deltas)
+            trending.record('comment', deltas)
+        
+        committed = _bulk_insert(Comment, rows, results, before_commit=count_comments)
+        cache.delete(*{f'post:{row["post_id"]}' for row in committed})
+        return _bulk_response(results)
     
     @staticmethod
     def get_comment(comment_id):
         """Get comment by ID"""
-        comment = Comment.query.get(comment_id)
-        if not comment:
-            return {'error': 'Comment not found'}, 404
-        return comment.to_dict(), 200
+        data = cache.get(f'comment:{comment_id}')
+        if data is None:
+            comment = Comment.query.options(*Comment.load_options()).get(comment_id)
+            if not comment:
+                return {'error': 'Comment not found'}, 404
+            data = comment.to_dict()
+            cache.set(f'comment:{comment_id}', data, depends_on=[f'user:{comment.user_id}'])
+        return data, 200
+    
+    @staticmethod
+    def get_comments(ids):
+        """Get several comments by ID"""
+        query = Comment.query.options(*Comment.load_options())
+        comments, missing = _get_many(
+            query, Comment, ids, Comment.to_dict, 'comment', lambda comment: [f'user:{comment.user_id}']
+        )
+        return {'comments': comments, 'missing': missing}, 200
     
     @staticmethod
-    def get_post_comments(post_id, page=1, per_page=10):
+    def get_post_comments(post_id, page=1, per_page=10, cursor=None):
         """Get all comments for a post"""
-        pagination = Comment.query.filter_by(post_id=post_id, is_approved=True).paginate(page=page, per_page=per_page)
+        query = Comment.query.options(*Comment.load_options()).filter_by(post_id=post_id, is_approved=True)
+        if cursor is not None:
+            try:
+                comments, next_cursor = keyset_paginate(query, Comment, cursor, per_page)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            return {
+                'comments': [c.to_dict() for c in comments],
+                'next_cursor': next_cursor
+            }, 200
+        pagination = query.paginate(page=page, per_page=per_page)
         return {
             'comments': [c.to_dict() for c in pagination.items],
             'total': pagination.total,
@@ -230,6 +783,11 @@ class CommentController:
             'current_page': page
         }, 200
     
+    @staticmethod
+    def export_comments(since=None):
+        """Stream every comment (updated at or after since) as NDJSON"""
+        return _export_rows(Comment, Comment.updated_at, since)
+    
     @staticmethod
     def update_comment(comment_id, data, user_id):
         """Update a comment"""
@@ -246,10 +804,11 @@ class CommentController:
             
             comment.updated_at = datetime.utcnow()
             db.session.commit()
+            cache.delete(f'comment:{comment_id}', f'post:{comment.post_id}')
             return comment.to_dict(), 200
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
     
     @staticmethod
     def delete_comment(comment_id, user_id):
@@ -262,12 +821,17 @@ class CommentController:
             if comment.user_id != user_id:
                 return {'error': 'Unauthorized'}, 403
             
+            if comment.is_approved:
+                _adjust_post_counter(comment.post_id, Post.comments_count, -1)
+                trending.record('comment', {comment.post_id: -1})
+            post_id = comment.post_id
             db.session.delete(comment)
             db.session.commit()
+            cache.delete(f'comment:{comment_id}', f'post:{post_id}')
             return {'message': 'Comment deleted successfully'}, 200
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
 
 
 class CategoryController:
@@ -290,7 +854,7 @@ class CategoryController:
             return category.to_dict(), 201
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
     
     @staticmethod
     def get_category(category_id):
@@ -306,6 +870,27 @@ class CategoryController:
         categories = Category.query.all()
         return [c.to_dict() for c in categories], 200
     
+    @staticmethod
+    def get_categories(ids):
+        """Get several categories by ID"""
+        categories, missing = _get_many(Category.query, Category, ids, Category.to_dict)
+        return {'categories': categories, 'missing': missing}, 200
+    
+    @staticmethod
+    def get_category_posts(category_id, per_page=10, cursor=None, status='published', fields=None):
+        """Get a category's posts, newest first, with cursor pagination"""
+        if not db.session.get(Category, category_id):
+            return {'error': 'Category not found'}, 404
+        query = Post.query.options(*Post.load_options(fields=fields)).filter_by(category_id=category_id, status=status)
+        try:
+            posts, next_cursor = keyset_paginate(query, Post, cursor, per_page)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return {
+            'posts': [p.to_dict(fields=fields) for p in posts],
+            'next_cursor': next_cursor
+        }, 200
+    
     @staticmethod
     def update_category(category_id, data):
         """Update a category"""
@@ -314,7 +899,8 @@ class CategoryController:
             if not category:
                 return {'error': 'Category not found'}, 404
             
-            if 'name' in data:
+            renamed = 'name' in data and data['name'] != category.name
+            if renamed:
                 category.name = data['name']
             if 'description' in data:
                 category.description = data['description']
@@ -325,10 +911,13 @@ class CategoryController:
             
             category.updated_at = datetime.utcnow()
             db.session.commit()
+            if renamed:
+                # Cached posts show the old category name
+                cache.bump(f'category:{category_id}')
             return category.to_dict(), 200
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
     
     @staticmethod
     def delete_category(category_id):
@@ -340,18 +929,25 @@ class CategoryController:
             
             db.session.delete(category)
             db.session.commit()
+            cache.bump(f'category:{category_id}')
             return {'message': 'Category deleted successfully'}, 200
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
 
 
 class TagController:
     """Handle tag-related operations"""
     
+    REQUIRED_FIELDS = ('name', 'slug')
+    FIELD_TYPES = {'name': str, 'slug': str}
+    
     @staticmethod
     def create_tag(data):
         """Create a new tag"""
+        error = _field_error(data, TagController.REQUIRED_FIELDS, TagController.FIELD_TYPES)
+        if error:
+            return {'error': error}, 400
         try:
             if Tag.query.filter_by(slug=data.get('slug')).first():
                 return {'error': 'Tag slug already exists'}, 400
@@ -365,7 +961,39 @@ class TagController:
             return tag.to_dict(), 201
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
+    
+    @staticmethod
+    def bulk_create_tags(items):
+        """Validate and insert many tags, reporting a result per item"""
+        error = _check_bulk_size(items)
+        if error:
+            return error
+        results, valid = _validate_required(items, TagController.REQUIRED_FIELDS, TagController.FIELD_TYPES)
+        slugs = {item['slug'] for _, item in valid}
+        names = {item['name'] for _, item in valid}
+        taken_slugs = set(db.session.scalars(db.select(Tag.slug).where(Tag.slug.in_(slugs))))
+        taken_names = set(db.session.scalars(db.select(Tag.name).where(Tag.name.in_(names))))
+        
+        now = datetime.utcnow()
+        rows = []
+        for index, item in valid:
+            if item['slug'] in taken_slugs:
+                _reject(results, index, 'Tag slug already exists')
+            elif item['name'] in taken_names:
+                _reject(results, index, 'Tag name already exists')
+            else:
+                # Later duplicates within the batch collide with this one
+                taken_slugs.add(item['slug'])
+                taken_names.add(item['name'])
+                rows.append((index, {
+                    'name': item['name'],
+                    'slug': item['slug'],
+                    'created_at': now,
+                    'updated_at': now
+                }))
+        _bulk_insert(Tag, rows, results)
+        return _bulk_response(results)
     
     @staticmethod
     def get_tag(tag_id):
@@ -381,6 +1009,33 @@ class TagController:
         tags = Tag.query.all()
         return [t.to_dict() for t in tags], 200
     
+    @staticmethod
+    def get_tags(ids):
+        """Get several tags by ID"""
+        tags, missing = _get_many(Tag.query, Tag, ids, Tag.to_dict)
+        return {'tags': tags, 'missing': missing}, 200
+    
+    @staticmethod
+    def get_tag_posts(tag_id, per_page=10, cursor=None, status='published', fields=None):
+        """Get a tag's posts, newest first, with cursor pagination"""
+        if not db.session.get(Tag, tag_id):
+            return {'error': 'Tag not found'}, 404
+        # Driven from post_tags, which carries each post's status and
+        # created_at, so the page is a range of one index
+        query = Post.query.options(*Post.load_options(fields=fields)).join(
+            post_tags, post_tags.c.post_id == Post.id
+        ).filter(post_tags.c.tag_id == tag_id, post_tags.c.status == status)
+        try:
+            posts, next_cursor = keyset_paginate(
+                query, Post, cursor, per_page, keys=(post_tags.c.created_at, post_tags.c.post_id)
+            )
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return {
+            'posts': [p.to_dict(fields=fields) for p in posts],
+            'next_cursor': next_cursor
+        }, 200
+    
     @staticmethod
     def delete_tag(tag_id):
         """Delete a tag"""
@@ -394,54 +1049,170 @@ class TagController:
             return {'message': 'Tag deleted successfully'}, 200
         except Exception as e:
             db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
 
 
 class LikeController:
     """Handle like-related operations"""
     
+    REQUIRED_FIELDS = ('user_id', 'post_id')
+    FIELD_TYPES = {'user_id': int, 'post_id': int}
+    
+    @staticmethod
+    def _pair_error(user_id, post_id):
+        """400 response for ids posted in a like's body that are not integers, or None"""
+        error = _field_error(
+            {'user_id': user_id, 'post_id': post_id}, LikeController.REQUIRED_FIELDS, LikeController.FIELD_TYPES
+        )
+        return ({'error': error}, 400) if error else None
+    
+    @staticmethod
+    def _set_like(user_id, post_id, liked):
+        """Apply one like or unlike and commit, returning what changed"""
+        now = datetime.utcnow()
+        try:
+            changed = likes.apply({(user_id, post_id): liked}, now)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        likes.forget(changed)
+        return changed, now
+    
     @staticmethod
     def like_post(user_id, post_id):
         """Like a post"""
+        error = LikeController._pair_error(user_id, post_id)
+        if error:
+            return error
         try:
-            post = Post.query.get(post_id)
-            if not post:
+            changed, now = LikeController._set_like(user_id, post_id, True)
+        except Exception as e:
+            return _server_error(e)
+        if not changed:
+            # Nothing inserted: find out why, off the hot path
+            if not Post.query.get(post_id):
                 return {'error': 'Post not found'}, 404
-            
-            existing_like = Like.query.filter_by(user_id=user_id, post_id=post_id).first()
-            if existing_like:
-                return {'error': 'You already liked this post'}, 400
-            
-            like = Like(user_id=user_id, post_id=post_id)
-            db.session.add(like)
-            db.session.commit()
-            return like.to_dict(), 201
+            return {'error': 'You already liked this post'}, 400
+        return {
+            'id': changed[(user_id, post_id)],
+            'user_id': user_id,
+            'post_id': post_id,
+            'created_at': now.isoformat()
+        }, 201
+    
+    @staticmethod
+    def put_like(user_id, post_id):
+        """Like a post idempotently: 201 when added, 200 when already liked, 202 when queued"""
+        state = {'user_id': user_id, 'post_id': post_id, 'liked': True}
+        if like_queue.enabled:
+            like_queue.record(user_id, post_id, True)
+            return state, 202
+        try:
+            changed, _ = LikeController._set_like(user_id, post_id, True)
         except Exception as e:
-            db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
+        if changed:
+            return state, 201
+        if not Post.query.get(post_id):
+            return {'error': 'Post not found'}, 404
+        return state, 200
+    
+    @staticmethod
+    def bulk_like_posts(items):
+        """Validate and insert many likes, reporting a result per item"""
+        error = _check_bulk_size(items)
+        if error:
+            return error
+        results, valid = _validate_required(items, LikeController.REQUIRED_FIELDS, LikeController.FIELD_TYPES)
+        user_ids = {item['user_id'] for _, item in valid}
+        post_ids = {item['post_id'] for _, item in valid}
+        pairs = {(item['user_id'], item['post_id']) for _, item in valid}
+        known_users = set(db.session.scalars(
+            db.select(User.id).where(User.id.in_(user_ids), User.deleted_at.is_(None))
+        ))
+        known_posts = set(db.session.scalars(db.select(Post.id).where(Post.id.in_(post_ids))))
+        existing = set()
+        if pairs:
+            existing = set(db.session.execute(
+                db.select(Like.user_id, Like.post_id).where(db.tuple_(Like.user_id, Like.post_id).in_(pairs))
+            ).tuples())
+        
+        now = datetime.utcnow()
+        rows = []
+        for index, item in valid:
+            pair = (item['user_id'], item['post_id'])
+            if item['user_id'] not in known_users:
+                _reject(results, index, 'User not found', 404)
+            elif item['post_id'] not in known_posts:
+                _reject(results, index, 'Post not found', 404)
+            elif pair in existing:
+                _reject(results, index, 'You already liked this post')
+            else:
+                existing.add(pair)
+                rows.append((index, {'user_id': pair[0], 'post_id': pair[1], 'created_at': now}))
+        
+        def count_likes(params, ids):
+            deltas = {}
+            for row in params:
+                deltas[row['post_id']] = deltas.get(row['post_id'], 0) + 1
+            Post.adjust_counters(Post.likes_count, deltas)
+            trending.record('like', deltas)
+        
+        committed = _bulk_insert(Like, rows, results, before_commit=count_likes)
+        cache.delete(*{f'post:{row["post_id"]}' for row in committed})
+        return _bulk_response(results)
     
     @staticmethod
     def unlike_post(user_id, post_id):
         """Unlike a post"""
+        error = LikeController._pair_error(user_id, post_id)
+        if error:
+            return error
         try:
-            like = Like.query.filter_by(user_id=user_id, post_id=post_id).first()
-            if not like:
-                return {'error': 'Like not found'}, 404
-            
-            db.session.delete(like)
-            db.session.commit()
-            return {'message': 'Post unliked successfully'}, 200
+            changed, _ = LikeController._set_like(user_id, post_id, False)
         except Exception as e:
-            db.session.rollback()
-            return {'error': str(e)}, 500
+            return _server_error(e)
+        if not changed:
+            return {'error': 'Like not found'}, 404
+        return {'message': 'Post unliked successfully'}, 200
     
     @staticmethod
-    def get_post_likes(post_id, page=1, per_page=10):
+    def delete_like(user_id, post_id):
+        """Unlike a post idempotently: 200 whether or not it was liked, 202 when queued"""
+        state = {'user_id': user_id, 'post_id': post_id, 'liked': False}
+        if like_queue.enabled:
+            like_queue.record(user_id, post_id, False)
+            return state, 202
+        try:
+            LikeController._set_like(user_id, post_id, False)
+        except Exception as e:
+            return _server_error(e)
+        return state, 200
+    
+    @staticmethod
+    def get_post_likes(post_id, page=1, per_page=10, cursor=None):
         """Get all likes for a post"""
-        pagination = Like.query.filter_by(post_id=post_id).paginate(page=page, per_page=per_page)
+        query = Like.query.filter_by(post_id=post_id)
+        if cursor is not None:
+            try:
+                likes, next_cursor = keyset_paginate(query, Like, cursor, per_page)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            return {
+                'likes': [l.to_dict() for l in likes],
+                'next_cursor': next_cursor
+            }, 200
+        pagination = query.paginate(page=page, per_page=per_page)
         return {
             'likes': [l.to_dict() for l in pagination.items],
             'total': pagination.total,
             'pages': pagination.pages,
             'current_page': page
         }, 200
+    
+    @staticmethod
+    def export_likes(since=None):
+        """Stream every like (created at or after since) as NDJSON"""
+        # Likes are never edited, so creation time stands in for updated_at
+        return _export_rows(Like, Like.created_at, since)
\ No newline at end of file
@@ -0,0 +1,112 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is saturated or a hash takes too long"""
+
+
+def _normalize_method(method):
+    """Expand a method to the full form stored in hashes ('pbkdf2' -> 'pbkdf2:sha256:<iterations>')"""
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    if name == 'scrypt':
+        # Werkzeug's defaults for whichever of n, r and p are left out
+        n, r, p = args + ['32768', '8', '1'][len(args):]
+        return f'scrypt:{n}:{r}:{p}'
+    return method
+
+
+class PasswordHasher:
+    """Hash and verify passwords in a bounded process pool.
+
+    Key stretching is deliberately CPU-bound, so it runs in worker processes
+    instead of on the request thread. At most ``workers + queue`` hashes are
+    in flight per process; past that, and when a hash is not done within the
+    timeout, HasherBusy is raised so the caller can answer 503 straight away
+    instead of piling up requests. 0 workers hashes inline.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.workers = 0
+        self.timeout = None
+        self._slots = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._atexit_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = _normalize_method(app.config.get('PASSWORD_HASH_METHOD', self.method))
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT') or None
+        self._slots = threading.BoundedSemaphore(self.workers + app.config.get('PASSWORD_HASH_QUEUE', 0))
+        app.extensions['password_hasher'] = self
+        if not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Whether a stored hash was made with a method other than the configured one"""
+        return pwhash.split('$', 1)[0] != self.method
+
+    def shutdown(self, wait=False):
+        """Stop the worker processes, waiting for them to exit if wait is set"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('Password hashing pool is saturated')
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the worker is done, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy('Password hashing timed out') from None
+
+    def _get_executor(self):
+        # Created lazily so each forked worker gets its own pool
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                # Spawned, not forked: this process runs request and flush
+                # threads whose held locks a forked child would inherit. Not
+                # forkserver either: its server is shared process-wide state
+                # that breaks in workers forked after it started
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+
+password_hasher = PasswordHasher()
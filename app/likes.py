@@ -0,0 +1,215 @@
+import threading
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import IntegrityError
+from app.background import BackgroundWorker
+from app.models import db, User, Post, Like
+from app.cache import cache
+from app import trending
+
+# Likes are written with one conflict-tolerant statement each: the insert
+# selects from posts (so a missing or deleted post inserts nothing) and
+# leaves an existing (user_id, post_id) row alone, and the delete removes
+# at most the one row. Counters move only by the rows actually changed, so
+# repeated or racing requests neither fail on unique_user_post_like nor
+# skew likes_count.
+
+
+def _add(user_id, post_id, now):
+    """Insert a like unless it exists or the post is gone; returns its id, or None"""
+    source = db.select(db.literal(user_id), Post.id, db.literal(now)).where(
+        Post.id == post_id, Post.deleted_at.is_(None)
+    )
+    columns = ['user_id', 'post_id', 'created_at']
+    dialect = db.session.get_bind().dialect.name
+    # Only a duplicate of unique_user_post_like is tolerated
+    if dialect == 'sqlite':
+        stmt = sqlite.insert(Like).from_select(columns, source).on_conflict_do_nothing(
+            index_elements=['user_id', 'post_id']
+        )
+        result = db.session.execute(stmt)
+        return result.lastrowid if result.rowcount == 1 else None
+    if dialect == 'mysql':
+        # Selecting only when the user exists too makes both foreign keys
+        # hold, so IGNORE can only skip the duplicate; a skipped row counts
+        # 0 whether or not the connection reports found rows
+        source = source.where(db.select(User.id).where(User.id == user_id).exists())
+        result = db.session.execute(db.insert(Like).from_select(columns, source).prefix_with('IGNORE'))
+        return result.lastrowid if result.rowcount == 1 else None
+    try:
+        with db.session.begin_nested():
+            result = db.session.execute(db.insert(Like).from_select(columns, source).returning(Like.id))
+            return result.scalar()
+    except IntegrityError:
+        if db.session.scalar(db.select(Like.id).where(Like.user_id == user_id, Like.post_id == post_id)) is None:
+            raise
+        return None
+
+
+def _remove(user_id, post_id):
+    """Delete a like; returns whether there was one"""
+    return db.session.execute(
+        db.delete(Like).where(Like.user_id == user_id, Like.post_id == post_id)
+    ).rowcount == 1
+
+
+def apply(changes, now=None):
+    """Set likes ({(user_id, post_id): liked}) inside the caller's transaction.
+
+    Counters and trending scores move by what actually changed. Returns the
+    pairs that changed, mapped to the new like's id for likes and to None
+    for unlikes. The caller commits and then calls forget() on the result.
+    """
+    now = now or datetime.utcnow()
+    changed = {}
+    deltas = {}
+    for (user_id, post_id), liked in changes.items():
+        if liked:
+            like_id = _add(user_id, post_id, now)
+            if like_id is None:
+                continue
+            changed[(user_id, post_id)] = like_id
+        elif _remove(user_id, post_id):
+            changed[(user_id, post_id)] = None
+        else:
+            continue
+        deltas[post_id] = deltas.get(post_id, 0) + (1 if liked else -1)
+    deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+    if deltas:
+        Post.adjust_counters(Post.likes_count, deltas)
+        trending.record('like', deltas)
+    return changed
+
+
+def forget(changed):
+    """Drop the cached details of the posts whose likes changed"""
+    cache.delete(*{f'post:{post_id}' for _, post_id in changed})
+
+
+class LikeQueue(BackgroundWorker):
+    """Optional write-behind queue that group-commits likes and unlikes.
+
+    With LIKE_QUEUE_INTERVAL set, the idempotent PUT/DELETE like endpoints
+    only record the wanted state here and answer 202. Repeated toggles of
+    the same like coalesce to the last one, and a background thread applies
+    everything queued in one transaction every LIKE_QUEUE_INTERVAL seconds,
+    or as soon as LIKE_QUEUE_MAX_PENDING likes are waiting. Whatever is
+    still queued is written when the process exits. An interval of 0 (the
+    default) leaves the queue off.
+
+    When that transaction fails, the likes are written one by one so a bad
+    one cannot hold back the rest. Those that still fail are queued again
+    for up to LIKE_QUEUE_MAX_RETRIES more flushes, then dropped and logged.
+    """
+
+    thread_name = 'like-queue-flush'
+
+    def __init__(self, app=None):
+        super().__init__()
+        self.app = None
+        self.max_pending = 1000
+        self.max_retries = 3
+        self._pending = {}
+        self._retries = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('LIKE_QUEUE_INTERVAL', 0)
+        self.max_pending = app.config.get('LIKE_QUEUE_MAX_PENDING', 1000)
+        self.max_retries = app.config.get('LIKE_QUEUE_MAX_RETRIES', 3)
+        app.extensions['like_queue'] = self
+        self.register_shutdown()
+
+    @property
+    def enabled(self):
+        return bool(self.interval)
+
+    def record(self, user_id, post_id, liked):
+        """Queue the wanted state of a like"""
+        with self._lock:
+            self._pending[(user_id, post_id)] = liked
+            full = len(self._pending) >= self.max_pending
+        self.ensure_thread()
+        if full:
+            self.wake()
+
+    def flush(self):
+        """Apply everything queued in one transaction, returning the number of likes that changed"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        if has_app_context():
+            return self._flush(pending)
+        with self.app.app_context():
+            return self._flush(pending)
+
+    def shutdown(self):
+        """Stop the flush thread and write out anything still queued"""
+        self.stop()
+        if self.app is not None:
+            self.flush()
+
+    def _flush(self, pending):
+        try:
+            return len(self._write(pending))
+        except Exception:
+            if len(pending) == 1:
+                current_app.logger.exception('Failed to flush a queued like')
+                self._requeue(pending)
+                return 0
+            current_app.logger.exception('Failed to flush %d queued likes, writing them one by one', len(pending))
+        changed = 0
+        failed = {}
+        for pair, liked in pending.items():
+            try:
+                changed += len(self._write({pair: liked}))
+            except Exception:
+                failed[pair] = liked
+        if failed:
+            current_app.logger.warning('%d queued likes failed again', len(failed))
+            self._requeue(failed)
+        return changed
+
+    def _requeue(self, failed):
+        """Queue failed likes for the next flush, dropping those out of retries"""
+        dropped = []
+        with self._lock:
+            for pair, liked in failed.items():
+                retries = self._retries.get(pair, 0) + 1
+                if retries > self.max_retries:
+                    self._retries.pop(pair, None)
+                    dropped.append((pair, liked))
+                    continue
+                self._retries[pair] = retries
+                # Unless a newer state was recorded since
+                self._pending.setdefault(pair, liked)
+        for (user_id, post_id), liked in dropped:
+            current_app.logger.error(
+                'Dropped queued %s of post %s by user %s after %d failed flushes',
+                'like' if liked else 'unlike', post_id, user_id, self.max_retries + 1
+            )
+
+    def _write(self, pending):
+        try:
+            changed = apply(pending)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        forget(changed)
+        if self._retries:
+            with self._lock:
+                for pair in pending:
+                    self._retries.pop(pair, None)
+        return changed
+
+    def run_once(self):
+        self.flush()
+
+
+like_queue = LikeQueue()
@@ -0,0 +1,215 @@
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from app.cache import cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Cumulative histogram keyed by label values"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # One slot per bucket, +Inf, then the sum
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(counts) for labels, counts in self._values.items()}
+        for labels, counts in values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                le = bound if bound == '+Inf' else _number(bound)
+                yield f'{self.name}_bucket', _labels(self.labelnames, labels, [('le', le)]), cumulative
+            yield f'{self.name}_sum', _labels(self.labelnames, labels), counts[-1]
+            yield f'{self.name}_count', _labels(self.labelnames, labels), cumulative
+
+
+class Collected:
+    """Values read at scrape time from a callback returning {label values: value}"""
+
+    def __init__(self, name, documentation, labelnames, collect, type='gauge'):
+        self.type = type
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in self.collect().items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Metrics:
+    """Request, SQL, connection pool and cache metrics in Prometheus text format.
+
+    Requests are timed per endpoint; SQL statements are counted and timed
+    through engine events, both per bind and per request; connection pool
+    checkouts are timed by the session. Recording is a few perf_counter
+    calls and a locked dict update. Values are per process: with several
+    gunicorn workers each scrape sees the worker that served it.
+    """
+
+    def __init__(self, app=None):
+        self.requests = Counter('http_requests_total', 'HTTP requests', ('endpoint', 'method', 'status'))
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'Time to produce a response', ('endpoint', 'method')
+        )
+        self.request_statements = Histogram(
+            'http_request_db_statements', 'SQL statements run per request', ('endpoint',), STATEMENT_BUCKETS
+        )
+        self.request_db_time = Histogram(
+            'http_request_db_seconds', 'Time spent in SQL statements per request', ('endpoint',)
+        )
+        self.statements = Histogram(
+            'db_statement_duration_seconds', 'SQL statement execution time', ('bind',)
+        )
+        self.checkout = Histogram(
+            'db_pool_checkout_seconds', 'Time waiting for a pooled connection', ('bind',)
+        )
+        self.collectors = [
+            self.requests, self.latency, self.request_statements, self.request_db_time,
+            self.statements, self.checkout,
+            Collected(
+                'db_pool_connections', 'Pooled connections by state', ('bind', 'state'), self.pool_status
+            ),
+            Collected('cache_hits_total', 'Cache lookups served from the cache', (),
+                      lambda: {(): cache.hits}, 'counter'),
+            Collected('cache_misses_total', 'Cache lookups that missed', (),
+                      lambda: {(): cache.misses}, 'counter'),
+            Collected('cache_evictions_total', 'Entries evicted to bound the cache size', (),
+                      lambda: {(): cache.backend.evictions}, 'counter'),
+            Collected('cache_entries', 'Entries in the cache', (), lambda: {(): len(cache.backend)}),
+        ]
+        self._binds = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        db = app.extensions['sqlalchemy']
+        with app.app_context():
+            engines = dict(db.engines)
+        self._binds = {engine: key or 'primary' for key, engine in engines.items()}
+        for engine, bind in self._binds.items():
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._make_after_cursor_execute(bind))
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['metrics'] = self
+
+    def observe_checkout(self, engine, seconds):
+        """Record the time a session waited to get a connection from an engine's pool"""
+        self.checkout.observe((self._binds.get(engine, 'primary'),), seconds)
+
+    def pool_status(self):
+        """Connections checked out and idle per bind"""
+        values = {}
+        for engine, bind in self._binds.items():
+            pool = engine.pool
+            if hasattr(pool, 'checkedout'):
+                values[(bind, 'checked_out')] = pool.checkedout()
+                values[(bind, 'idle')] = pool.checkedin()
+        return values
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.collectors:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.db_statements = 0
+        g.db_time = 0.0
+
+    def _after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        # Unrouted requests share one label so bad URLs cannot grow the series
+        endpoint = request.endpoint or 'unmatched'
+        self.latency.observe((endpoint, request.method), time.perf_counter() - start)
+        self.requests.inc((endpoint, request.method, response.status_code))
+        self.request_statements.observe((endpoint,), g.db_statements)
+        self.request_db_time.observe((endpoint,), g.db_time)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context.metrics_start = time.perf_counter()
+
+    def _make_after_cursor_execute(self, bind):
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - context.metrics_start
+            self.statements.observe((bind,), elapsed)
+            if has_request_context() and 'db_statements' in g:
+                g.db_statements += 1
+                g.db_time += elapsed
+        return after_cursor_execute
+
+
+metrics = Metrics()
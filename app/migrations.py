@@ -0,0 +1,222 @@
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateTable
+from app.models import (
+    db, User, Post, Comment, Like, PostScore, TrendingState, RevokedToken, SchemaVersion, post_tags,
+    forget_soft_delete_ready, soft_delete_ready
+)
+from app.search import rebuild_index
+
+# Schema changes are applied by `flask db-upgrade` or init_db.py; the app
+# only checks the version at startup (unless SCHEMA_AUTO_UPGRADE is set, as
+# in development and testing). Each migration is a function registered with its
+# version number; add new ones at the end with the next number. Operations
+# go through the helpers below, which skip what already exists, so a
+# migration can run against a database that create_all() has partly
+# brought up to date.
+#
+# A new database is created from the models and stamped with the latest
+# version. A database created before versioning existed has the tables but
+# no schema_version; it is taken to be at BASELINE.
+
+BASELINE = 1
+MIGRATIONS = []
+
+
+class SchemaOutdated(Exception):
+    """Raised at startup when the database is behind the models"""
+
+
+def migration(version, description):
+    """Register a function as the migration to a schema version"""
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def head():
+    """The schema version the models expect"""
+    return MIGRATIONS[-1][0] if MIGRATIONS else BASELINE
+
+
+def current_version():
+    """The schema version of the database, or None if it is not versioned"""
+    if not db.inspect(db.engine).has_table(SchemaVersion.__tablename__):
+        return None
+    return db.session.scalar(db.select(db.func.max(SchemaVersion.version)))
+
+
+def upgrade():
+    """Bring the database schema up to head(), returning the versions applied"""
+    try:
+        return _upgrade()
+    finally:
+        # Re-check the schema now rather than inside the first request
+        forget_soft_delete_ready()
+        soft_delete_ready(db.engine)
+
+
+def _upgrade():
+    tables = db.inspect(db.engine).get_table_names()
+    if SchemaVersion.__tablename__ not in tables:
+        if User.__tablename__ not in tables:
+            db.create_all()
+            _stamp(head(), 'Initial schema')
+            return [head()]
+        SchemaVersion.__table__.create(db.engine)
+        _stamp(BASELINE, 'Schema before versioning')
+
+    current = current_version()
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version <= current:
+            continue
+        fn()
+        _stamp(version, description)
+        applied.append(version)
+    return applied
+
+
+def check_schema(app):
+    """Verify at startup, with one query, that the database schema is current"""
+    with app.app_context():
+        if app.config.get('SCHEMA_AUTO_UPGRADE'):
+            upgrade()
+            return
+        current = current_version()
+        if current is None or current < head():
+            raise SchemaOutdated(
+                f'Database schema is at version {current}, expected {head()}; run `flask db-upgrade`'
+            )
+
+
+def _stamp(version, description):
+    try:
+        db.session.add(SchemaVersion(version=version, description=description))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _create_tables(*tables):
+    for table in tables:
+        table.create(db.engine, checkfirst=True)
+
+
+def _add_column(table, column):
+    inspector = db.inspect(db.engine)
+    if column.name in {c['name'] for c in inspector.get_columns(table.name)}:
+        return
+    ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+    with db.engine.begin() as conn:
+        conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+
+
+def _create_indexes(*indexes):
+    inspector = db.inspect(db.engine)
+    for index in indexes:
+        if index.name not in {i['name'] for i in inspector.get_indexes(index.table.name)}:
+            index.create(db.engine)
+
+
+def _index(table, name):
+    return next(index for index in table.indexes if index.name == name)
+
+
+def _cascade_foreign_keys(table):
+    """Bring a table's foreign keys in line with the model's ON DELETE rules"""
+    if db.engine.dialect.name == 'sqlite':
+        _rebuild_sqlite_table(table)
+        return
+    existing = db.inspect(db.engine).get_foreign_keys(table.name)
+    for constraint in table.foreign_key_constraints:
+        if not constraint.ondelete:
+            continue
+        columns = [c.name for c in constraint.columns]
+        for fk in existing:
+            if fk['constrained_columns'] == columns and (fk.get('options') or {}).get('ondelete') != constraint.ondelete:
+                with db.engine.begin() as conn:
+                    conn.execute(db.text(f"ALTER TABLE {table.name} DROP FOREIGN KEY {fk['name']}"))
+                    conn.execute(AddConstraint(constraint))
+
+
+def _rebuild_sqlite_table(table):
+    # SQLite cannot alter constraints: create the table afresh from the
+    # model, copy the rows over and swap it in, with foreign keys off so
+    # dropping the old table does not cascade
+    existing = {c['name'] for c in db.inspect(db.engine).get_columns(table.name)}
+    columns = ', '.join(c.name for c in table.columns if c.name in existing)
+    create = str(CreateTable(table).compile(dialect=db.engine.dialect)).replace(
+        f'CREATE TABLE {table.name} (', f'CREATE TABLE {table.name}__new (', 1
+    )
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA foreign_keys = OFF')
+        conn.commit()
+        try:
+            with conn.begin():
+                conn.exec_driver_sql(create)
+                conn.exec_driver_sql(f'INSERT INTO {table.name}__new ({columns}) SELECT {columns} FROM {table.name}')
+                conn.exec_driver_sql(f'DROP TABLE {table.name}')
+                conn.exec_driver_sql(f'ALTER TABLE {table.name}__new RENAME TO {table.name}')
+                for index in table.indexes:
+                    index.create(conn)
+        finally:
+            conn.exec_driver_sql('PRAGMA foreign_keys = ON')
+            conn.commit()
+
+
+@migration(2, 'Post counters, pagination and feed indexes, trending and token tables')
+def _counters_indexes_trending_tokens():
+    _add_column(Post.__table__, Post.__table__.c.likes_count)
+    _add_column(Post.__table__, Post.__table__.c.comments_count)
+    _create_indexes(
+        _index(User.__table__, 'ix_users_created_at_id'),
+        _index(Post.__table__, 'ix_posts_status_created_at_id'),
+        _index(Post.__table__, 'ix_posts_category_status_created_at_id'),
+        _index(Comment.__table__, 'ix_comments_post_approved_created_at'),
+        _index(Like.__table__, 'ix_likes_post_created_at_id'),
+        _index(post_tags, 'ix_post_tags_tag_id_post_id'),
+    )
+    _create_tables(PostScore.__table__, TrendingState.__table__, RevokedToken.__table__)
+
+    # Backfill the counters
+    likes = db.select(db.func.count(Like.id)).where(Like.post_id == Post.id).scalar_subquery()
+    comments = db.select(db.func.count(Comment.id)).where(
+        Comment.post_id == Post.id, Comment.is_approved.is_(True)
+    ).scalar_subquery()
+    with db.engine.begin() as conn:
+        conn.execute(Post.__table__.update().values(
+            likes_count=likes, comments_count=comments, updated_at=Post.__table__.c.updated_at
+        ))
+
+    # Full-text search: a FULLTEXT index on MySQL, an FTS5 table on SQLite
+    if db.engine.dialect.name == 'mysql':
+        _create_indexes(_index(Post.__table__, 'ix_posts_title_content_fulltext'))
+    elif db.engine.dialect.name == 'sqlite':
+        rebuild_index()
+
+
+@migration(3, 'ON DELETE CASCADE foreign keys and soft-delete columns')
+def _cascades_soft_delete():
+    _add_column(User.__table__, User.__table__.c.deleted_at)
+    _add_column(Post.__table__, Post.__table__.c.deleted_at)
+    for table in (Post.__table__, Comment.__table__, Like.__table__, post_tags):
+        _cascade_foreign_keys(table)
+    _create_indexes(
+        _index(User.__table__, 'ix_users_deleted_at'),
+        _index(Post.__table__, 'ix_posts_deleted_at'),
+    )
+
+
+@migration(4, "Posts' status and created_at copied onto post_tags for the tag feed")
+def _tag_feed_index():
+    _add_column(post_tags, post_tags.c.status)
+    _add_column(post_tags, post_tags.c.created_at)
+    try:
+        Post.sync_tag_links()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    _create_indexes(_index(post_tags, 'ix_post_tags_tag_status_created_at_post'))
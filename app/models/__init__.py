@@ -1,7 +1,11 @@
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Table 1: Users
 class User(db.Model):
@@ -16,11 +20,16 @@ class User(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)  # set until purged, see app/purge.py
     
-    # Relationships
-    posts = db.relationship('Post', backref='author', lazy=True, cascade='all, delete-orphan')
-    comments = db.relationship('Comment', backref='author', lazy=True, cascade='all, delete-orphan')
-    likes = db.relationship('Like', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Composite index backing cursor pagination
+    __table_args__ = (db.Index('ix_users_created_at_id', 'created_at', 'id'),)
+    
+    # Relationships; the database deletes the children (ON DELETE CASCADE),
+    # so deleting a user does not load them first
+    posts = db.relationship('Post', backref='author', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    comments = db.relationship('Comment', backref='author', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    likes = db.relationship('Like', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -44,38 +53,116 @@ class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False, index=True)
     content = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
     status = db.Column(db.String(50), default='draft')  # draft, published, archived
     views_count = db.Column(db.Integer, default=0)
+    likes_count = db.Column(db.Integer, default=0)
+    comments_count = db.Column(db.Integer, default=0)  # approved comments only
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     published_at = db.Column(db.DateTime, nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)  # set until purged, see app/purge.py
     
-    # Relationships
-    comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
-    likes = db.relationship('Like', backref='post', lazy=True, cascade='all, delete-orphan')
-    tags = db.relationship('Tag', secondary='post_tags', backref='posts', lazy=True)
+    # Composite indexes backing cursor pagination of the status and category
+    # feeds, and the MySQL full-text index used by search (SQLite uses an
+    # FTS5 table instead)
+    __table_args__ = (
+        db.Index('ix_posts_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_posts_category_status_created_at_id', 'category_id', 'status', 'created_at', 'id'),
+        db.Index('ix_posts_title_content_fulltext', 'title', 'content', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+    
+    # Relationships; comments, likes and tag links are deleted by the database
+    comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    likes = db.relationship('Like', backref='post', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    tags = db.relationship(
+        'Tag', secondary='post_tags', backref=db.backref('posts', passive_deletes=True), lazy=True, passive_deletes=True
+    )
     
     def __repr__(self):
         return f'<Post {self.title}>'
     
-    def to_dict(self, include_comments=False):
-        data = {
+    # Fields of to_dict(), in payload order
+    FIELDS = (
+        'id', 'title', 'content', 'status', 'views_count', 'likes_count', 'comments_count',
+        'author', 'category', 'created_at', 'updated_at', 'published_at'
+    )
+    
+    @classmethod
+    def load_options(cls, fields=None):
+        """Eager-load the relationships read by to_dict().
+        
+        With a sparse fieldset only the columns behind those fields are
+        loaded (plus id and created_at, which pagination needs).
+        """
+        if fields is None:
+            options = [db.joinedload(cls.author), db.joinedload(cls.category)]
+        else:
+            columns = [getattr(cls, f) for f in fields if f in cls.__table__.columns]
+            options = [db.load_only(cls.id, cls.created_at, *columns)]
+            if 'author' in fields:
+                options.append(db.joinedload(cls.author).load_only(User.username))
+            if 'category' in fields:
+                options.append(db.joinedload(cls.category).load_only(Category.name))
+        return options
+    
+    @classmethod
+    def adjust_counters(cls, column, deltas):
+        """Add per-post deltas ({post_id: delta}) to a counter column with one executemany UPDATE"""
+        if not deltas:
+            return
+        posts = cls.__table__
+        stmt = posts.update().where(posts.c.id == db.bindparam('b_post_id')).values({
+            column.key: db.func.coalesce(posts.c[column.key], 0) + db.bindparam('b_delta'),
+            # Counter bumps are not edits; keep the onupdate hook away from updated_at
+            'updated_at': posts.c.updated_at
+        })
+        db.session.execute(stmt, [{'b_post_id': post_id, 'b_delta': delta} for post_id, delta in deltas.items()])
+    
+    @classmethod
+    def sync_tag_links(cls, post_ids=None):
+        """Copy the posts' status and created_at onto their post_tags rows.
+        
+        Call it, after a flush, whenever a post's tags or status change.
+        Without post_ids every row is synced.
+        """
+        posts = cls.__table__
+        post = db.select(posts).where(posts.c.id == post_tags.c.post_id)
+        stmt = post_tags.update().values(
+            status=post.with_only_columns(posts.c.status).scalar_subquery(),
+            created_at=post.with_only_columns(posts.c.created_at).scalar_subquery()
+        )
+        if post_ids is not None:
+            stmt = stmt.where(post_tags.c.post_id.in_(post_ids))
+        db.session.execute(stmt)
+    
+    def to_dict(self, fields=None):
+        if fields is not None:
+            # Only touch the requested attributes; the rest were not loaded
+            return {f: self._serialize_field(f) for f in self.FIELDS if f in fields}
+        return {
             'id': self.id,
             'title': self.title,
             'content': self.content,
             'status': self.status,
             'views_count': self.views_count,
+            'likes_count': self.likes_count,
+            'comments_count': self.comments_count,
             'author': self.author.username,
             'category': self.category.name if self.category else None,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'published_at': self.published_at.isoformat() if self.published_at else None
         }
-        if include_comments:
-            data['comments'] = [c.to_dict() for c in self.comments]
-        return data
+    
+    def _serialize_field(self, field):
+        if field == 'author':
+            return self.author.username
+        if field == 'category':
+            return self.category.name if self.category else None
+        value = getattr(self, field)
+        return value.isoformat() if isinstance(value, datetime) else value
 
 # Table 3: Comments
 class Comment(db.Model):
@@ -83,14 +170,25 @@ class Comment(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
     is_approved = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Composite index backing cursor pagination of a post's approved comments
+    __table_args__ = (
+        db.Index('ix_comments_post_approved_created_at', 'post_id', 'is_approved', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
-        return f'<Comment by {self.author.username}>'
+        # Ids only: loading the author here would query on every repr
+        return f'<Comment {self.id} by user {self.user_id}>'
+    
+    @classmethod
+    def load_options(cls):
+        """Eager-load the relationships read by to_dict()"""
+        return [db.joinedload(cls.author)]
     
     def to_dict(self):
         return {
@@ -157,12 +255,16 @@ class Like(db.Model):
     __tablename__ = 'likes'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Unique constraint to prevent duplicate likes
-    __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_like'),)
+    # Unique constraint to prevent duplicate likes, plus an index backing
+    # cursor pagination of a post's likes
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_like'),
+        db.Index('ix_likes_post_created_at_id', 'post_id', 'created_at', 'id'),
+    )
     
     def __repr__(self):
         return f'<Like user_id={self.user_id} post_id={self.post_id}>'
@@ -178,6 +280,110 @@ class Like(db.Model):
 # Association Table for Post-Tag relationship
 post_tags = db.Table(
     'post_tags',
-    db.Column('post_id', db.Integer, db.ForeignKey('posts.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True)
+    db.Column('post_id', db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # Copied from the post (see Post.sync_tag_links), so a tag's feed is read
+    # in order from the last index below without probing untagged posts
+    db.Column('status', db.String(50), nullable=True),
+    db.Column('created_at', db.DateTime, nullable=True),
+    # The primary key serves post -> tags; these serve tag -> posts
+    db.Index('ix_post_tags_tag_id_post_id', 'tag_id', 'post_id'),
+    db.Index('ix_post_tags_tag_status_created_at_post', 'tag_id', 'status', 'created_at', 'post_id')
 )
+
+# Table 7: Post Scores (materialized trending ranking)
+class PostScore(db.Model):
+    __tablename__ = 'post_scores'
+    
+    # No foreign key: rows of deleted posts are pruned by the decay job
+    post_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0, index=True)
+    
+    def __repr__(self):
+        return f'<PostScore post_id={self.post_id} score={self.score}>'
+
+# Table 8: Trending State (single row recording the last decay run)
+class TrendingState(db.Model):
+    __tablename__ = 'trending_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    decayed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<TrendingState decayed_at={self.decayed_at}>'
+
+# Table 9: Revoked Tokens (access tokens logged out before they expire)
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    
+    jti = db.Column(db.String(32), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<RevokedToken {self.jti}>'
+
+# Table 10: Schema Version (migrations applied to this database)
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200))
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaVersion {self.version}>'
+
+# Resolve backrefs (Post.author, Comment.post, ...) up front so loader
+# options can reference them before the first query runs
+db.configure_mappers()
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores foreign keys, ON DELETE CASCADE included, unless each connection enables them"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys = ON')
+        cursor.close()
+
+# Engines whose posts table has the deleted_at column. A database older
+# than migration 3 lacks it until upgraded, and must stay queryable for the
+# migrations themselves
+_soft_delete_ready = {}
+
+def soft_delete_ready(engine):
+    """Whether the database behind engine has posts.deleted_at"""
+    if engine not in _soft_delete_ready:
+        inspector = db.inspect(engine)
+        if not inspector.has_table(Post.__tablename__):
+            return False
+        columns = {c['name'] for c in inspector.get_columns(Post.__tablename__)}
+        _soft_delete_ready[engine] = 'deleted_at' in columns
+    return _soft_delete_ready[engine]
+
+def forget_soft_delete_ready():
+    """Check the schema again on the next query, e.g. after a migration"""
+    _soft_delete_ready.clear()
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _hide_deleted_posts(execute_state):
+    """Leave soft-deleted posts, and deleted users' comments, out of every ORM query.
+    
+    Joins and relationship loads included; pass
+    execution_options(include_deleted=True) to see them. Users are filtered
+    explicitly where they are looked up.
+    """
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.execution_options.get('include_deleted', False)
+        and soft_delete_ready(db.engine)
+    ):
+        execute_state.statement = execute_state.statement.options(
+            db.with_loader_criteria(Post, lambda cls: cls.deleted_at.is_(None), include_aliases=True),
+            db.with_loader_criteria(
+                Comment,
+                lambda cls: cls.user_id.not_in(db.select(User.id).where(User.deleted_at.isnot(None))),
+                include_aliases=True
+            )
+        )
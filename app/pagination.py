@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+from app.models import db
+
+
+def encode_cursor(item):
+    """Encode the (created_at, id) position of an item as an opaque token"""
+    raw = json.dumps([item.created_at.isoformat(), item.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token back to (created_at, id), raising ValueError if malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def _seek(query, keys, cursor):
+    """Order a query newest first and skip to the rows after the cursor"""
+    key_created_at, key_id = keys
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            key_created_at < created_at,
+            db.and_(key_created_at == created_at, key_id < item_id)
+        ))
+    return query.order_by(key_created_at.desc(), key_id.desc())
+
+
+def keyset_paginate(query, model, cursor=None, per_page=10, keys=None):
+    """Return one page of a query ordered newest first, seeking past the cursor.
+
+    Rows are ordered on (created_at, id) descending and the next page starts
+    strictly after the last row of this one, so deep pages cost the same as
+    the first and no COUNT(*) is issued. An empty cursor starts from the top.
+    keys names other columns holding the model's (created_at, id), such as
+    copies on a joined table whose index should drive the query.
+    """
+    if per_page < 1:
+        raise ValueError('per_page must be at least 1')
+    keys = keys or (model.created_at, model.id)
+    items = _seek(query, keys, cursor).limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    next_cursor = encode_cursor(items[-1]) if has_more else None
+    return items, next_cursor
@@ -0,0 +1,147 @@
+from app.background import BackgroundWorker
+from app.models import db, User, Post, Comment, Like
+from app.cache import cache
+from app.controllers import PostController
+from app.search import remove_posts
+from app import trending
+
+
+class Purger(BackgroundWorker):
+    """Background removal of soft-deleted users and posts.
+
+    With SOFT_DELETE, deleting a user or post only stamps deleted_at (on a
+    user's posts too), which hides it at once. This job then deletes what
+    hangs off it PURGE_BATCH_SIZE rows per transaction, a post's likes and
+    comments and a user's likes, comments and posts, recounting the
+    counters of the other posts they were on, and finally the row itself.
+    No transaction holds more than one chunk of locks however large the
+    graph. It runs on a background thread every PURGE_INTERVAL seconds and
+    straight after a delete; an interval of 0 purges inside the deleting
+    request. Every step is idempotent, so several processes may purge at
+    once, and `flask purge-deleted` runs it on demand.
+    """
+
+    thread_name = 'purge'
+
+    def __init__(self, app=None):
+        super().__init__()
+        self.app = None
+        self.batch_size = 1000
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('PURGE_INTERVAL', 0)
+        self.batch_size = app.config.get('PURGE_BATCH_SIZE', 1000)
+        app.extensions['purger'] = self
+        if self.interval:
+            # Also picks up deletes left over from before a restart
+            app.before_request(self.ensure_thread)
+        self.register_shutdown()
+
+    def schedule(self):
+        """Purge soon: right away when the interval is 0, else on the background thread"""
+        if not self.interval:
+            self.purge()
+            return
+        self.ensure_thread()
+        self.wake()
+
+    def purge(self):
+        """Remove every soft-deleted post and user, returning how many of each"""
+        posts = self._purge_all(Post, self._purge_post)
+        # A user's posts are stamped with them, so the pass above emptied
+        # most; _purge_user catches any written after the delete
+        users = self._purge_all(User, self._purge_user)
+        return posts, users
+
+    def shutdown(self):
+        """Stop the background thread; an interrupted purge resumes on the next run"""
+        self.stop()
+
+    def _purge_all(self, model, purge_one):
+        purged = 0
+        while True:
+            ids = db.session.scalars(
+                db.select(model.id).where(model.deleted_at.isnot(None)).order_by(model.id)
+                .limit(self.batch_size).execution_options(include_deleted=True)
+            ).all()
+            if not ids:
+                return purged
+            for row_id in ids:
+                purge_one(row_id)
+                purged += 1
+
+    def _purge_post(self, post_id):
+        self._delete_chunks(Like, Like.post_id == post_id)
+        self._delete_chunks(Comment, Comment.post_id == post_id, forget_comments=True)
+        try:
+            remove_posts([post_id])
+            trending.forget([post_id])
+            # Only the tag links are left for the database to cascade
+            db.session.execute(db.delete(Post).where(Post.id == post_id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        cache.delete(f'post:{post_id}')
+
+    def _purge_user(self, user_id):
+        while True:
+            post_ids = db.session.scalars(
+                db.select(Post.id).where(Post.user_id == user_id).limit(self.batch_size)
+                .execution_options(include_deleted=True)
+            ).all()
+            if not post_ids:
+                break
+            for post_id in post_ids:
+                self._purge_post(post_id)
+        self._delete_chunks(Like, Like.user_id == user_id, recount=True)
+        self._delete_chunks(Comment, Comment.user_id == user_id, recount=True, forget_comments=True)
+        try:
+            db.session.execute(db.delete(User).where(User.id == user_id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        cache.delete(f'user:{user_id}')
+
+    def _delete_chunks(self, model, criterion, recount=False, forget_comments=False):
+        # Select a chunk of ids, delete exactly those and commit, until none
+        # are left. Counters are recounted from the remaining rows rather
+        # than decremented, so a chunk purged twice by racing processes
+        # cannot skew them.
+        while True:
+            rows = db.session.execute(
+                db.select(model.id, model.post_id).where(criterion).order_by(model.id).limit(self.batch_size)
+                .execution_options(include_deleted=True)
+            ).all()
+            if not rows:
+                return
+            ids = [row.id for row in rows]
+            post_ids = {row.post_id for row in rows}
+            try:
+                db.session.execute(db.delete(model).where(model.id.in_(ids)))
+                if recount:
+                    # Commits the delete with the new counts
+                    PostController.recount_counters(post_ids)
+                else:
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            keys = [f'comment:{comment_id}' for comment_id in ids] if forget_comments else []
+            if recount:
+                keys += [f'post:{post_id}' for post_id in post_ids]
+            cache.delete(*keys)
+
+    def run_once(self):
+        try:
+            with self.app.app_context():
+                self.purge()
+        except Exception:
+            self.app.logger.exception('Failed to purge deleted users and posts')
+
+
+purger = Purger()
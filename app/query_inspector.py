@@ -0,0 +1,121 @@
+import time
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (with QUERY_BUDGET_RAISE) when a request runs more statements than its view allows"""
+
+
+def query_budget(max_statements):
+    """Declare the most SQL statements a view may run per request.
+
+    Put it directly under the route decorator. The budget is only checked
+    while the query inspector is enabled.
+    """
+    def decorator(view):
+        view.query_budget = max_statements
+        return view
+    return decorator
+
+
+class QueryInspector:
+    """Development and test aid that looks at the SQL each request runs.
+
+    Every response gets an X-Query-Count header. A statement repeated
+    QUERY_N_PLUS_ONE_THRESHOLD or more times with different parameters in
+    one request is logged as a likely N+1 (a lazy load in a loop).
+    Statements slower than QUERY_SLOW_THRESHOLD seconds are logged with
+    their endpoint and the database's EXPLAIN output. Requests that exceed
+    the budget declared on their view with @query_budget are logged, or
+    fail with QueryBudgetExceeded when QUERY_BUDGET_RAISE is set, as it is
+    under testing. Off unless QUERY_INSPECTOR_ENABLED.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.slow_threshold = None
+        self.n_plus_one_threshold = 5
+        self.raise_on_budget = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('QUERY_INSPECTOR_ENABLED', False)
+        app.extensions['query_inspector'] = self
+        if not self.enabled:
+            return
+        self.slow_threshold = app.config.get('QUERY_SLOW_THRESHOLD')
+        self.n_plus_one_threshold = app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        self.raise_on_budget = app.config.get('QUERY_BUDGET_RAISE', False)
+        db = app.extensions['sqlalchemy']
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g.query_log = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context.inspector_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.inspector_start
+        in_request = has_request_context() and 'query_log' in g
+        if in_request:
+            g.query_log.append((statement, None if executemany else repr(parameters)))
+        if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+            endpoint = request.endpoint if in_request else None
+            plan = self._explain(cursor, statement, parameters, conn.dialect.name) if not executemany else None
+            current_app.logger.warning(
+                'Slow query (%.3fs) in %s: %s %r%s', elapsed, endpoint or '<no request>',
+                statement, parameters, f'\n{plan}' if plan else ''
+            )
+
+    def _explain(self, cursor, statement, parameters, dialect):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return None
+        prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+        # A raw cursor on the same connection, so the EXPLAIN does not go
+        # through the engine events again
+        explain = cursor.connection.cursor()
+        try:
+            explain.execute(prefix + statement, parameters)
+            return '\n'.join(' | '.join(str(value) for value in row) for row in explain.fetchall())
+        except Exception as e:
+            return f'(EXPLAIN failed: {e})'
+        finally:
+            explain.close()
+
+    def _after_request(self, response):
+        log = g.pop('query_log', None)
+        if log is None:
+            return response
+        response.headers['X-Query-Count'] = str(len(log))
+        endpoint = request.endpoint or '<unmatched>'
+
+        params_by_statement = {}
+        for statement, params in log:
+            params_by_statement.setdefault(statement, set()).add(params)
+        for statement, params in params_by_statement.items():
+            if len(params) >= self.n_plus_one_threshold:
+                current_app.logger.warning(
+                    'Possible N+1 in %s: statement ran %d times with different parameters: %s',
+                    endpoint, len(params), statement
+                )
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None and len(log) > budget:
+            message = f'{endpoint} ran {len(log)} SQL statements, over its budget of {budget}'
+            if self.raise_on_budget:
+                raise QueryBudgetExceeded(message)
+            current_app.logger.error(message)
+        return response
+
+
+query_inspector = QueryInspector()
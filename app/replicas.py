@@ -0,0 +1,139 @@
+import random
+import time
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql import CompoundSelect, Select, TextClause
+
+STICKY_COOKIE = 'read_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRouter:
+    """Send the reads of GET requests to read replicas.
+
+    Replicas are the SQLALCHEMY_BINDS whose key starts with ``replica``.
+    A request reads from one replica, picked at random, until it writes
+    anything; writes, locking reads and requests of other methods use the
+    primary. After a successful write the client gets a short-lived cookie
+    that keeps its reads on the primary for REPLICA_STICKY_SECONDS, so it
+    sees its own writes despite replication lag. A replica whose connections
+    fail is skipped for REPLICA_RETRY_INTERVAL seconds.
+    """
+
+    def __init__(self, app=None):
+        self.keys = []
+        self.sticky_seconds = 0
+        self.retry_interval = 30
+        self._down_until = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith('replica'))
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 0)
+        self.retry_interval = app.config.get('REPLICA_RETRY_INTERVAL', 30)
+        self._down_until = {}
+        app.extensions['replica_router'] = self
+        if not self.keys:
+            return
+        db = app.extensions['sqlalchemy']
+        with app.app_context():
+            for key in self.keys:
+                event.listen(db.engines[key], 'handle_error', self._make_error_handler(key))
+        app.after_request(self._mark_sticky)
+
+    def choose(self):
+        """Bind key of a healthy replica for this request, or None to use the primary"""
+        if not self.keys or not has_request_context() or request.method not in SAFE_METHODS:
+            return None
+        if request.cookies.get(STICKY_COOKIE, type=float, default=0) > time.time():
+            return None
+        now = time.monotonic()
+        healthy = [key for key in self.keys if self._down_until.get(key, 0) <= now]
+        return random.choice(healthy) if healthy else None
+
+    def _make_error_handler(self, key):
+        def handle_error(context):
+            if context.is_disconnect or context.connection is None:
+                self._down_until[key] = time.monotonic() + self.retry_interval
+                current_app.logger.warning('Read replica %s is unavailable, using the primary', key)
+        return handle_error
+
+    def _mark_sticky(self, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and self.sticky_seconds:
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + self.sticky_seconds),
+                max_age=int(self.sticky_seconds) + 1, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+def _is_read(clause):
+    if isinstance(clause, (Select, CompoundSelect)):
+        return clause._for_update_arg is None
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip().upper().startswith('SELECT')
+    return False
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica chosen by ReplicaRouter until it writes.
+
+    Routing only overrides the public get_bind() hook. The replica's
+    connection is checked out when the replica is chosen, so one that
+    cannot be reached leaves the session on the primary instead of failing
+    the request.
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._replica = None
+        self._replica_chosen = False
+        self._wrote = False
+        self._checkout_started = None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # A connection, if the session needs a new one, is checked out next;
+        # see _observe_checkout
+        self._checkout_started = time.perf_counter()
+        if bind is None and not self._wrote and clause is not None:
+            if not _is_read(clause):
+                # Stay on the primary for the rest of the session
+                self._wrote = True
+            else:
+                replica = self._replica_engine()
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica_engine(self):
+        if not self._replica_chosen:
+            self._replica_chosen = True
+            router = current_app.extensions.get('replica_router')
+            key = router.choose() if router else None
+            if key is not None:
+                try:
+                    self.connection(bind_arguments={'bind': self._db.engines[key]})
+                    self._replica = key
+                except DBAPIError:
+                    # ReplicaRouter has marked it down
+                    pass
+        return self._db.engines[self._replica] if self._replica is not None else None
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _stay_on_primary(session, flush_context, instances):
+    session._wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _observe_checkout(session, transaction, connection):
+    """Time the checkout of each connection the session begins a transaction on"""
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None and session._checkout_started is not None:
+        metrics.observe_checkout(connection.engine, time.perf_counter() - session._checkout_started)
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,85 @@
+import re
+from sqlalchemy.dialects import mysql
+from app.models import db, Post
+
+# SQLite keeps the index in an FTS5 table keyed by post id; it is created
+# alongside the posts table. MySQL uses the FULLTEXT index declared on Post
+# and maintains it itself.
+FTS_TABLE = 'posts_fts'
+
+db.event.listen(Post.__table__, 'after_create', db.DDL(
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(title, content)'
+).execute_if(dialect='sqlite'))
+db.event.listen(Post.__table__, 'before_drop', db.DDL(
+    f'DROP TABLE IF EXISTS {FTS_TABLE}'
+).execute_if(dialect='sqlite'))
+
+
+class SearchNotSupported(Exception):
+    """Raised when the database has no full-text search backend"""
+
+
+def _dialect(required=False):
+    name = db.session.get_bind().dialect.name
+    if required and name not in ('sqlite', 'mysql'):
+        raise SearchNotSupported(f'Full-text search is not supported on {name}')
+    return name
+
+
+def _fts5_query(q):
+    """Quote each word so user input cannot use FTS5 query syntax"""
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', q))
+
+
+def index_posts(rows):
+    """Add or replace (id, title, content) rows in the index, inside the caller's transaction"""
+    if _dialect() != 'sqlite' or not rows:
+        return
+    params = [{'id': post_id, 'title': title, 'content': content} for post_id, title, content in rows]
+    db.session.execute(db.text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), params)
+    db.session.execute(db.text(
+        f'INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (:id, :title, :content)'
+    ), params)
+
+
+def remove_posts(post_ids):
+    """Drop posts from the index, inside the caller's transaction"""
+    if _dialect() != 'sqlite' or not post_ids:
+        return
+    db.session.execute(db.text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), [{'id': i} for i in post_ids])
+
+
+def search_post_ids(q, status='published', limit=10, offset=0):
+    """Ids of the posts matching q, best match first"""
+    if _dialect(required=True) == 'sqlite':
+        match = _fts5_query(q)
+        if not match:
+            return []
+        return db.session.scalars(db.text(
+            f'SELECT p.id FROM {FTS_TABLE} JOIN posts p ON p.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH :match AND p.status = :status '
+            f'ORDER BY bm25({FTS_TABLE}) LIMIT :limit OFFSET :offset'
+        ), {'match': match, 'status': status, 'limit': limit, 'offset': offset}).all()
+
+    score = mysql.match(Post.title, Post.content, against=q).in_natural_language_mode()
+    return db.session.scalars(
+        db.select(Post.id).where(score > 0, Post.status == status)
+        .order_by(score.desc()).limit(limit).offset(offset)
+    ).all()
+
+
+def rebuild_index():
+    """Rebuild the index from the posts table, returning the number of posts indexed"""
+    if _dialect(required=True) == 'sqlite':
+        db.session.execute(db.text(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(title, content)'
+        ))
+        db.session.execute(db.text(f'DELETE FROM {FTS_TABLE}'))
+        db.session.execute(db.text(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, content) SELECT id, title, content FROM posts'
+        ))
+    else:
+        db.session.execute(db.text('OPTIMIZE TABLE posts'))
+    db.session.commit()
+    # Soft-deleted posts are indexed too, and the column may not exist yet
+    return db.session.scalar(db.select(db.func.count(Post.id)).execution_options(include_deleted=True))
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.dialects import mysql, sqlite
+from app.models import db, Post, Like, Comment, PostScore, TrendingState
+
+# Trending ranks posts by a time-decayed sum of weighted likes, comments and
+# views kept in post_scores. Writes add their weight to a post's score as
+# they happen; a periodic batch job (decay()) scales every score down by
+# the time elapsed since its last run, so reads are a plain ORDER BY score.
+
+WEIGHT_SETTINGS = {
+    'like': 'TRENDING_LIKE_WEIGHT',
+    'comment': 'TRENDING_COMMENT_WEIGHT',
+    'view': 'TRENDING_VIEW_WEIGHT',
+}
+
+
+def record(kind, counts):
+    """Add weighted events ({post_id: count}) to scores, inside the caller's transaction"""
+    weight = current_app.config[WEIGHT_SETTINGS[kind]]
+    deltas = {post_id: n * weight for post_id, n in counts.items() if n}
+    if not deltas or not weight:
+        return
+    rows = [{'post_id': post_id, 'score': delta} for post_id, delta in deltas.items()]
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        stmt = sqlite.insert(PostScore)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['post_id'], set_={'score': PostScore.score + stmt.excluded.score}
+        )
+        db.session.execute(stmt, rows)
+    elif dialect == 'mysql':
+        stmt = mysql.insert(PostScore)
+        stmt = stmt.on_duplicate_key_update(score=PostScore.score + stmt.inserted.score)
+        db.session.execute(stmt, rows)
+    else:
+        for row in rows:
+            updated = PostScore.query.filter_by(post_id=row['post_id']).update(
+                {PostScore.score: PostScore.score + row['score']}, synchronize_session=False
+            )
+            if not updated:
+                db.session.add(PostScore(**row))
+        db.session.flush()
+
+
+def forget(post_ids):
+    """Drop the scores of deleted posts, inside the caller's transaction"""
+    if post_ids:
+        PostScore.query.filter(PostScore.post_id.in_(post_ids)).delete(synchronize_session=False)
+
+
+def top_post_ids(limit=10, offset=0, status='published'):
+    """Ids of the highest scoring posts"""
+    return db.session.scalars(
+        db.select(PostScore.post_id).join(Post, Post.id == PostScore.post_id)
+        .where(Post.status == status)
+        .order_by(PostScore.score.desc(), PostScore.post_id.desc())
+        .limit(limit).offset(offset)
+    ).all()
+
+
+def decay(now=None):
+    """Apply the decay accrued since the last run and prune negligible scores.
+
+    Meant to run every few minutes from a single scheduler (flask
+    decay-trending); the state row is locked so overlapping runs do not
+    decay twice. Returns the factor applied.
+    """
+    now = now or datetime.utcnow()
+    try:
+        state = TrendingState.query.with_for_update().get(1)
+        if state is None:
+            state = TrendingState(id=1, decayed_at=now)
+            db.session.add(state)
+        elapsed = max((now - state.decayed_at).total_seconds(), 0)
+        factor = 0.5 ** (elapsed / current_app.config['TRENDING_HALF_LIFE'])
+        if factor < 1:
+            PostScore.query.update({PostScore.score: PostScore.score * factor}, synchronize_session=False)
+        PostScore.query.filter(
+            db.or_(
+                PostScore.score < current_app.config['TRENDING_MIN_SCORE'],
+                ~db.exists().where(Post.id == PostScore.post_id)
+            )
+        ).delete(synchronize_session=False)
+        state.decayed_at = now
+        db.session.commit()
+        return factor
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def rebuild(now=None):
+    """Recompute every score from likes and comments.
+
+    Only events from the last ten half-lives are read (older ones have
+    decayed to under 0.1%); they are streamed and summed in Python, so no
+    database-specific math is needed. Views carry no timestamp and so are
+    not replayed. Returns the number of posts scored.
+    """
+    now = now or datetime.utcnow()
+    half_life = current_app.config['TRENDING_HALF_LIFE']
+    horizon = now - timedelta(seconds=half_life * 10)
+    scores = {}
+    for kind, model, extra in (
+        ('like', Like, ()),
+        ('comment', Comment, (Comment.is_approved.is_(True),))
+    ):
+        weight = current_app.config[WEIGHT_SETTINGS[kind]]
+        stmt = db.select(model.post_id, model.created_at).where(model.created_at >= horizon, *extra)
+        for post_id, created_at in db.session.execute(stmt.execution_options(yield_per=10000)):
+            age = max((now - created_at).total_seconds(), 0)
+            scores[post_id] = scores.get(post_id, 0) + weight * 0.5 ** (age / half_life)
+    try:
+        PostScore.query.delete(synchronize_session=False)
+        if scores:
+            db.session.execute(db.insert(PostScore), [
+                {'post_id': post_id, 'score': score} for post_id, score in scores.items()
+            ])
+        state = db.session.get(TrendingState, 1)
+        if state is None:
+            db.session.add(TrendingState(id=1, decayed_at=now))
+        else:
+            state.decayed_at = now
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(scores)
@@ -0,0 +1,94 @@
+import threading
+from flask import has_app_context
+from app.background import BackgroundWorker
+from app.models import db, Post
+from app.cache import cache
+from app import trending
+
+
+class ViewCounter(BackgroundWorker):
+    """Write-behind buffer for post view counts.
+
+    Reads only bump an in-process counter; a background thread periodically
+    applies the accumulated increments with one batched
+    ``UPDATE posts SET views_count = views_count + n`` per post, and whatever
+    is still buffered is flushed when the process exits. An interval of 0
+    writes every view through immediately.
+    """
+
+    thread_name = 'view-counter-flush'
+
+    def __init__(self, app=None):
+        super().__init__()
+        self.app = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('VIEW_COUNT_FLUSH_INTERVAL', 0)
+        app.extensions['view_counter'] = self
+        self.register_shutdown()
+
+    def record(self, post_id, n=1):
+        """Buffer n views of a post"""
+        with self._lock:
+            self._pending[post_id] = self._pending.get(post_id, 0) + n
+        if not self.interval:
+            self.flush()
+        else:
+            self.ensure_thread()
+
+    def pending(self, post_id):
+        """Views of a post recorded but not yet written to the database"""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def flush(self):
+        """Write all buffered increments in one transaction, returning the number of posts touched"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            if has_app_context():
+                self._write(pending)
+            else:
+                with self.app.app_context():
+                    self._write(pending)
+        except Exception:
+            # Put the increments back so the next flush retries them
+            with self._lock:
+                for post_id, n in pending.items():
+                    self._pending[post_id] = self._pending.get(post_id, 0) + n
+            if self.app is not None:
+                self.app.logger.exception('Failed to flush view counts')
+            return 0
+        return len(pending)
+
+    def shutdown(self):
+        """Stop the flush thread and write out anything still buffered"""
+        self.stop()
+        if self.app is not None:
+            self.flush()
+
+    def _write(self, pending):
+        try:
+            Post.adjust_counters(Post.views_count, pending)
+            trending.record('view', pending)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        # Cached post details hold the count as it was before this write;
+        # drop them so the next read picks up the written one (at most once
+        # per post per flush interval)
+        cache.delete(*(f'post:{post_id}' for post_id in pending))
+
+    def run_once(self):
+        self.flush()
+
+
+view_counter = ViewCounter()
@@ -1,8 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, abort, current_app, g, request, jsonify, stream_with_context
+from datetime import datetime
 from app.controllers import (
     UserController, PostController, CommentController,
     CategoryController, TagController, LikeController
 )
+from app.conditional import conditional
+from app.auth import auth_required
+from app.query_inspector import query_budget
+from app import batch
 
 # Define blueprints
 user_bp = Blueprint('users', __name__, url_prefix='/api/users')
@@ -11,6 +16,94 @@ comment_bp = Blueprint('comments', __name__, url_prefix='/api/comments')
 category_bp = Blueprint('categories', __name__, url_prefix='/api/categories')
 tag_bp = Blueprint('tags', __name__, url_prefix='/api/tags')
 like_bp = Blueprint('likes', __name__, url_prefix='/api/likes')
+batch_bp = Blueprint('batch', __name__, url_prefix='/api/batch')
+
+def _per_page_arg():
+    """The ?per_page= of a listing, capped at MAX_PER_PAGE; aborts with 400 below 1"""
+    per_page = request.args.get('per_page', 10, type=int)
+    if per_page < 1:
+        abort(400, description='per_page must be at least 1')
+    return min(per_page, current_app.config.get('MAX_PER_PAGE', 100))
+
+def _page_args():
+    """Pagination arguments shared by the list endpoints"""
+    return {
+        'page': request.args.get('page', 1, type=int),
+        'per_page': _per_page_arg(),
+        'cursor': request.args.get('cursor')
+    }
+
+def _feed_args():
+    """Arguments of the cursor-only post feeds"""
+    return {
+        'per_page': _per_page_arg(),
+        'cursor': request.args.get('cursor'),
+        'status': request.args.get('status', 'published')
+    }
+
+def _fields_arg():
+    """The ?fields= sparse fieldset of a post listing, or None; raises ValueError on unknown fields"""
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    fields = set(fields.split(','))
+    unknown = fields - set(PostController.FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+def _ids_arg():
+    """The ?ids= of a multi-get as a list of distinct ids, in order; raises ValueError if unusable"""
+    try:
+        ids = list(dict.fromkeys(int(i) for i in request.args.get('ids', '').split(',') if i.strip()))
+    except ValueError:
+        raise ValueError('ids must be comma-separated integers')
+    if not ids:
+        raise ValueError('ids is required')
+    limit = current_app.config.get('MULTI_GET_MAX_IDS', 100)
+    if len(ids) > limit:
+        raise ValueError(f'At most {limit} ids per request')
+    return ids
+
+def _multi_get(get_many, **kwargs):
+    """Answer a ?ids= multi-get with get_many(ids)"""
+    try:
+        ids = _ids_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result, status_code = get_many(ids, **kwargs)
+    return jsonify(result), status_code
+
+def _since_arg():
+    """The ?since= ISO timestamp of an export, or None; raises ValueError if malformed"""
+    since = request.args.get('since')
+    return datetime.fromisoformat(since) if since else None
+
+def _ndjson(lines):
+    """Stream NDJSON lines, keeping the request context for the DB session"""
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+def _bind_user(data):
+    """Act as the authenticated user: fill in data['user_id'], returning False if it names someone else.
+
+    Aborts with 400 unless data is a JSON object.
+    """
+    if not isinstance(data, dict):
+        abort(400, description='Expected a JSON object')
+    if str(data.get('user_id', g.user_id)) != str(g.user_id):
+        return False
+    data['user_id'] = g.user_id
+    return True
+
+def _forbidden():
+    return jsonify({'error': 'user_id does not match the authenticated user'}), 403
+
+def _bulk_items():
+    """The JSON array posted to a bulk endpoint, or None if the body is not one"""
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return None
+    return items
 
 # ============== User Routes ==============
 @user_bp.route('', methods=['POST'])
@@ -23,29 +116,39 @@ def create_user():
     return jsonify(result), status_code
 
 @user_bp.route('/<int:user_id>', methods=['GET'])
+@query_budget(1)
+@conditional()
 def get_user(user_id):
     """Get user by ID"""
     result, status_code = UserController.get_user(user_id)
     return jsonify(result), status_code
 
 @user_bp.route('', methods=['GET'])
+@query_budget(2)
+@conditional(trust_modified_since=False)
 def get_all_users():
-    """Get all users"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    result, status_code = UserController.get_all_users(page, per_page)
+    """Get all users, or the ones in ?ids="""
+    if 'ids' in request.args:
+        return _multi_get(UserController.get_users)
+    result, status_code = UserController.get_all_users(**_page_args())
     return jsonify(result), status_code
 
 @user_bp.route('/<int:user_id>', methods=['PUT'])
+@auth_required
 def update_user(user_id):
     """Update user"""
+    if user_id != g.user_id:
+        return _forbidden()
     data = request.get_json()
     result, status_code = UserController.update_user(user_id, data)
     return jsonify(result), status_code
 
 @user_bp.route('/<int:user_id>', methods=['DELETE'])
+@auth_required
 def delete_user(user_id):
     """Delete user"""
+    if user_id != g.user_id:
+        return _forbidden()
     result, status_code = UserController.delete_user(user_id)
     return jsonify(result), status_code
 
@@ -58,99 +161,205 @@ def login():
     result, status_code = UserController.login(data['username'], data['password'])
     return jsonify(result), status_code
 
+@user_bp.route('/logout', methods=['POST'])
+@auth_required
+def logout():
+    """Revoke the access token of the request"""
+    result, status_code = UserController.logout(g.token_claims)
+    return jsonify(result), status_code
+
 # ============== Post Routes ==============
 @post_bp.route('', methods=['POST'])
+@auth_required
 def create_post():
     """Create a new post"""
     data = request.get_json()
-    if not data or not all(k in data for k in ('title', 'content', 'user_id')):
+    if data and not _bind_user(data):
+        return _forbidden()
+    if not data or not all(k in data for k in PostController.REQUIRED_FIELDS):
         return jsonify({'error': 'Missing required fields'}), 400
     user_id = data.pop('user_id')
     result, status_code = PostController.create_post(data, user_id)
     return jsonify(result), status_code
 
+@post_bp.route('/bulk', methods=['POST'])
+@auth_required
+def bulk_create_posts():
+    """Create many posts"""
+    items = _bulk_items()
+    if items is None:
+        return jsonify({'error': 'Expected a non-empty JSON array'}), 400
+    if not all(_bind_user(item) for item in items if isinstance(item, dict)):
+        return _forbidden()
+    result, status_code = PostController.bulk_create_posts(items)
+    return jsonify(result), status_code
+
 @post_bp.route('/<int:post_id>', methods=['GET'])
+@query_budget(4)
+@conditional(ignore=('views_count',), trust_modified_since=False)
 def get_post(post_id):
     """Get post by ID"""
     result, status_code = PostController.get_post(post_id)
     return jsonify(result), status_code
 
 @post_bp.route('', methods=['GET'])
+@query_budget(2)
+@conditional(trust_modified_since=False)
 def get_all_posts():
-    """Get all posts"""
+    """Get all posts, or the ones in ?ids="""
+    try:
+        fields = _fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if 'ids' in request.args:
+        return _multi_get(PostController.get_posts, fields=fields)
+    status = request.args.get('status', 'published')
+    result, status_code = PostController.get_all_posts(status=status, fields=fields, **_page_args())
+    return jsonify(result), status_code
+
+@post_bp.route('/search', methods=['GET'])
+@query_budget(2)
+def search_posts():
+    """Search posts by title and content"""
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'q is required'}), 400
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    per_page = _per_page_arg()
     status = request.args.get('status', 'published')
-    result, status_code = PostController.get_all_posts(page, per_page, status)
+    try:
+        fields = _fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result, status_code = PostController.search_posts(q, page, per_page, status, fields)
     return jsonify(result), status_code
 
+@post_bp.route('/trending', methods=['GET'])
+@query_budget(2)
+def get_trending_posts():
+    """Get trending posts"""
+    page = request.args.get('page', 1, type=int)
+    per_page = _per_page_arg()
+    status = request.args.get('status', 'published')
+    try:
+        fields = _fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result, status_code = PostController.get_trending_posts(page, per_page, status, fields)
+    return jsonify(result), status_code
+
+@post_bp.route('/export', methods=['GET'])
+def export_posts():
+    """Stream all posts as NDJSON"""
+    try:
+        since = _since_arg()
+    except ValueError:
+        return jsonify({'error': 'Invalid since timestamp'}), 400
+    return _ndjson(PostController.export_posts(since))
+
 @post_bp.route('/<int:post_id>', methods=['PUT'])
+@auth_required
 def update_post(post_id):
     """Update post"""
-    data = request.get_json()
-    user_id = data.pop('user_id', None)
-    if not user_id:
-        return jsonify({'error': 'user_id is required'}), 400
+    data = request.get_json() or {}
+    if not _bind_user(data):
+        return _forbidden()
+    user_id = data.pop('user_id')
     result, status_code = PostController.update_post(post_id, data, user_id)
     return jsonify(result), status_code
 
 @post_bp.route('/<int:post_id>', methods=['DELETE'])
+@auth_required
 def delete_post(post_id):
     """Delete post"""
-    data = request.get_json()
-    user_id = data.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'user_id is required'}), 400
-    result, status_code = PostController.delete_post(post_id, user_id)
+    data = request.get_json(silent=True) or {}
+    if not _bind_user(data):
+        return _forbidden()
+    result, status_code = PostController.delete_post(post_id, g.user_id)
     return jsonify(result), status_code
 
 # ============== Comment Routes ==============
 @comment_bp.route('', methods=['POST'])
+@auth_required
 def create_comment():
     """Create a new comment"""
     data = request.get_json()
-    if not data or not all(k in data for k in ('content', 'post_id', 'user_id')):
+    if data and not _bind_user(data):
+        return _forbidden()
+    if not data or not all(k in data for k in CommentController.REQUIRED_FIELDS):
         return jsonify({'error': 'Missing required fields'}), 400
     user_id = data.pop('user_id')
     result, status_code = CommentController.create_comment(data, user_id)
     return jsonify(result), status_code
 
+@comment_bp.route('/bulk', methods=['POST'])
+@auth_required
+def bulk_create_comments():
+    """Create many comments"""
+    items = _bulk_items()
+    if items is None:
+        return jsonify({'error': 'Expected a non-empty JSON array'}), 400
+    if not all(_bind_user(item) for item in items if isinstance(item, dict)):
+        return _forbidden()
+    result, status_code = CommentController.bulk_create_comments(items)
+    return jsonify(result), status_code
+
+@comment_bp.route('', methods=['GET'])
+@query_budget(2)
+@conditional(trust_modified_since=False)
+def get_comments():
+    """Get the comments in ?ids="""
+    return _multi_get(CommentController.get_comments)
+
 @comment_bp.route('/<int:comment_id>', methods=['GET'])
+@query_budget(1)
+@conditional(trust_modified_since=False)
 def get_comment(comment_id):
     """Get comment by ID"""
     result, status_code = CommentController.get_comment(comment_id)
     return jsonify(result), status_code
 
 @comment_bp.route('/post/<int:post_id>', methods=['GET'])
+@query_budget(2)
+@conditional(trust_modified_since=False)
 def get_post_comments(post_id):
     """Get all comments for a post"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    result, status_code = CommentController.get_post_comments(post_id, page, per_page)
+    result, status_code = CommentController.get_post_comments(post_id, **_page_args())
     return jsonify(result), status_code
 
+@comment_bp.route('/export', methods=['GET'])
+def export_comments():
+    """Stream all comments as NDJSON"""
+    try:
+        since = _since_arg()
+    except ValueError:
+        return jsonify({'error': 'Invalid since timestamp'}), 400
+    return _ndjson(CommentController.export_comments(since))
+
 @comment_bp.route('/<int:comment_id>', methods=['PUT'])
+@auth_required
 def update_comment(comment_id):
     """Update comment"""
-    data = request.get_json()
-    user_id = data.pop('user_id', None)
-    if not user_id:
-        return jsonify({'error': 'user_id is required'}), 400
+    data = request.get_json() or {}
+    if not _bind_user(data):
+        return _forbidden()
+    user_id = data.pop('user_id')
     result, status_code = CommentController.update_comment(comment_id, data, user_id)
     return jsonify(result), status_code
 
 @comment_bp.route('/<int:comment_id>', methods=['DELETE'])
+@auth_required
 def delete_comment(comment_id):
     """Delete comment"""
-    data = request.get_json()
-    user_id = data.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'user_id is required'}), 400
-    result, status_code = CommentController.delete_comment(comment_id, user_id)
+    data = request.get_json(silent=True) or {}
+    if not _bind_user(data):
+        return _forbidden()
+    result, status_code = CommentController.delete_comment(comment_id, g.user_id)
     return jsonify(result), status_code
 
 # ============== Category Routes ==============
 @category_bp.route('', methods=['POST'])
+@auth_required
 def create_category():
     """Create a new category"""
     data = request.get_json()
@@ -160,18 +369,37 @@ def create_category():
     return jsonify(result), status_code
 
 @category_bp.route('/<int:category_id>', methods=['GET'])
+@query_budget(1)
+@conditional()
 def get_category(category_id):
     """Get category by ID"""
     result, status_code = CategoryController.get_category(category_id)
     return jsonify(result), status_code
 
 @category_bp.route('', methods=['GET'])
+@query_budget(1)
+@conditional(trust_modified_since=False)
 def get_all_categories():
-    """Get all categories"""
+    """Get all categories, or the ones in ?ids="""
+    if 'ids' in request.args:
+        return _multi_get(CategoryController.get_categories)
     result, status_code = CategoryController.get_all_categories()
     return jsonify(result), status_code
 
+@category_bp.route('/<int:category_id>/posts', methods=['GET'])
+@query_budget(2)
+@conditional(trust_modified_since=False)
+def get_category_posts(category_id):
+    """Get posts in a category"""
+    try:
+        fields = _fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result, status_code = CategoryController.get_category_posts(category_id, fields=fields, **_feed_args())
+    return jsonify(result), status_code
+
 @category_bp.route('/<int:category_id>', methods=['PUT'])
+@auth_required
 def update_category(category_id):
     """Update category"""
     data = request.get_json()
@@ -179,6 +407,7 @@ def update_category(category_id):
     return jsonify(result), status_code
 
 @category_bp.route('/<int:category_id>', methods=['DELETE'])
+@auth_required
 def delete_category(category_id):
     """Delete category"""
     result, status_code = CategoryController.delete_category(category_id)
@@ -186,27 +415,57 @@ def delete_category(category_id):
 
 # ============== Tag Routes ==============
 @tag_bp.route('', methods=['POST'])
+@auth_required
 def create_tag():
     """Create a new tag"""
     data = request.get_json()
-    if not data or not all(k in data for k in ('name', 'slug')):
+    if not data or not all(k in data for k in TagController.REQUIRED_FIELDS):
         return jsonify({'error': 'Missing required fields'}), 400
     result, status_code = TagController.create_tag(data)
     return jsonify(result), status_code
 
+@tag_bp.route('/bulk', methods=['POST'])
+@auth_required
+def bulk_create_tags():
+    """Create many tags"""
+    items = _bulk_items()
+    if items is None:
+        return jsonify({'error': 'Expected a non-empty JSON array'}), 400
+    result, status_code = TagController.bulk_create_tags(items)
+    return jsonify(result), status_code
+
 @tag_bp.route('/<int:tag_id>', methods=['GET'])
+@query_budget(1)
+@conditional()
 def get_tag(tag_id):
     """Get tag by ID"""
     result, status_code = TagController.get_tag(tag_id)
     return jsonify(result), status_code
 
 @tag_bp.route('', methods=['GET'])
+@query_budget(1)
+@conditional(trust_modified_since=False)
 def get_all_tags():
-    """Get all tags"""
+    """Get all tags, or the ones in ?ids="""
+    if 'ids' in request.args:
+        return _multi_get(TagController.get_tags)
     result, status_code = TagController.get_all_tags()
     return jsonify(result), status_code
 
+@tag_bp.route('/<int:tag_id>/posts', methods=['GET'])
+@query_budget(2)
+@conditional(trust_modified_since=False)
+def get_tag_posts(tag_id):
+    """Get posts with a tag"""
+    try:
+        fields = _fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result, status_code = TagController.get_tag_posts(tag_id, fields=fields, **_feed_args())
+    return jsonify(result), status_code
+
 @tag_bp.route('/<int:tag_id>', methods=['DELETE'])
+@auth_required
 def delete_tag(tag_id):
     """Delete tag"""
     result, status_code = TagController.delete_tag(tag_id)
@@ -214,27 +473,87 @@ def delete_tag(tag_id):
 
 # ============== Like Routes ==============
 @like_bp.route('', methods=['POST'])
+@auth_required
 def like_post():
     """Like a post"""
     data = request.get_json()
-    if not data or not all(k in data for k in ('user_id', 'post_id')):
+    if data and not _bind_user(data):
+        return _forbidden()
+    if not data or not all(k in data for k in LikeController.REQUIRED_FIELDS):
         return jsonify({'error': 'Missing user_id or post_id'}), 400
     result, status_code = LikeController.like_post(data['user_id'], data['post_id'])
     return jsonify(result), status_code
 
+@like_bp.route('/bulk', methods=['POST'])
+@auth_required
+def bulk_like_posts():
+    """Like many posts"""
+    items = _bulk_items()
+    if items is None:
+        return jsonify({'error': 'Expected a non-empty JSON array'}), 400
+    if not all(_bind_user(item) for item in items if isinstance(item, dict)):
+        return _forbidden()
+    result, status_code = LikeController.bulk_like_posts(items)
+    return jsonify(result), status_code
+
 @like_bp.route('', methods=['DELETE'])
+@auth_required
 def unlike_post():
     """Unlike a post"""
     data = request.get_json()
-    if not data or not all(k in data for k in ('user_id', 'post_id')):
+    if data and not _bind_user(data):
+        return _forbidden()
+    if not data or not all(k in data for k in LikeController.REQUIRED_FIELDS):
         return jsonify({'error': 'Missing user_id or post_id'}), 400
     result, status_code = LikeController.unlike_post(data['user_id'], data['post_id'])
     return jsonify(result), status_code
 
+@like_bp.route('/<int:post_id>', methods=['PUT'])
+@auth_required
+def put_like(post_id):
+    """Like a post as the authenticated user; repeating it changes nothing"""
+    result, status_code = LikeController.put_like(g.user_id, post_id)
+    return jsonify(result), status_code
+
+@like_bp.route('/<int:post_id>', methods=['DELETE'])
+@auth_required
+def delete_like(post_id):
+    """Unlike a post as the authenticated user; repeating it changes nothing"""
+    result, status_code = LikeController.delete_like(g.user_id, post_id)
+    return jsonify(result), status_code
+
 @like_bp.route('/post/<int:post_id>', methods=['GET'])
+@query_budget(2)
+@conditional(trust_modified_since=False)
 def get_post_likes(post_id):
     """Get all likes for a post"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    result, status_code = LikeController.get_post_likes(post_id, page, per_page)
+    result, status_code = LikeController.get_post_likes(post_id, **_page_args())
     return jsonify(result), status_code
+
+@like_bp.route('/export', methods=['GET'])
+def export_likes():
+    """Stream all likes as NDJSON"""
+    try:
+        since = _since_arg()
+    except ValueError:
+        return jsonify({'error': 'Invalid since timestamp'}), 400
+    return _ndjson(LikeController.export_likes(since))
+
+# ============== Batch Route ==============
+@batch_bp.route('', methods=['POST'])
+def run_batch():
+    """Run several API requests in one call"""
+    if batch.in_batch():
+        return jsonify({'error': 'Batches cannot be nested'}), 400
+    data = request.get_json(silent=True)
+    sub_requests = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(sub_requests, list) or not sub_requests:
+        return jsonify({'error': 'Expected a non-empty requests array'}), 400
+    limit = current_app.config.get('BATCH_MAX_REQUESTS', 20)
+    if len(sub_requests) > limit:
+        return jsonify({'error': f'At most {limit} requests per batch'}), 400
+    try:
+        responses = batch.dispatch(sub_requests)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'responses': responses}), 200
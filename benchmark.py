@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+"""
+HTTP benchmark harness
+Drive a fixed request mix against a freshly seeded app and record a baseline
+"""
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import platform
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from werkzeug.serving import WSGIRequestHandler, make_server
+from app import create_app
+from app.hashing import password_hasher
+from app.models import db
+from app.search import FTS_TABLE
+from seed_data import Plan, SEED_PASSWORD, seed
+
+# A run is reproducible: the data set is reseeded with fixed sizes and a
+# fixed seed and end date, every client draws its operations and post ids
+# from its own seeded random stream, and each client sends the same number
+# of requests. Only timings vary between runs of the same commit.
+#
+# The app is served by werkzeug's threaded server in a forked process, so
+# the client threads do not compete with it for the GIL. Latency is wall
+# time from sending a request to reading the whole response, over a
+# keep-alive connection per client.
+
+DATASET = {
+    'users': 1000, 'posts': 10000, 'comments': 20000, 'likes': 50000,
+    'categories': 20, 'tags': 200, 'seed': 42, 'until': datetime(2026, 1, 1),
+}
+DEFAULT_MIX = 'feed=35,post=35,like=15,comment=10,login=5'
+# Compared against a baseline, a change for the worse beyond the threshold
+# fails the run: overall throughput and p95, and the statements per request
+# of every operation. Per-operation latencies and p50/p99 are reported
+# only; with a few hundred samples they are too noisy to gate on
+GATED = {'throughput_rps': -1, 'p95_ms': 1, 'queries_per_request': 1}
+REPORTED = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+
+class _QuietHandler(WSGIRequestHandler):
+    # HTTP/1.1 keeps client connections open between requests
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Client:
+    """One simulated user: a keep-alive connection, an access token and a private random stream"""
+
+    def __init__(self, port, plan, index, seed):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.plan = plan
+        self.rng = random.Random(f'{seed}:client:{index}')
+        self.user_id = None
+        self.token = None
+        self.liked = set()
+
+    def request(self, method, path, body=None, auth=False):
+        """Send one request, returning (status, seconds, SQL statements, body); status is None on a network error"""
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if auth:
+            headers['Authorization'] = f'Bearer {self.token}'
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnects on the next request
+            self.conn.close()
+            return None, time.perf_counter() - start, None, None
+        elapsed = time.perf_counter() - start
+        queries = response.getheader('X-Query-Count')
+        return response.status, elapsed, int(queries) if queries else None, data
+
+    def authenticate(self, user_id):
+        status, _, _, data = self.request(
+            'POST', '/api/users/login', {'username': f'user{user_id}', 'password': SEED_PASSWORD}
+        )
+        if status != 200:
+            return False
+        result = json.loads(data)
+        self.user_id = result['id']
+        self.token = result['access_token']
+        return True
+
+    def _popular_post(self):
+        return self.plan.popular(self.rng, self.plan.posts)
+
+    # The operations of the mix
+
+    def feed(self):
+        return self.request('GET', '/api/posts?per_page=20')
+
+    def post(self):
+        return self.request('GET', f'/api/posts/{self._popular_post()}')
+
+    def like(self):
+        # Toggle on the idempotent like resource: unlike what this client
+        # liked before, like anything else. PUT and DELETE succeed whether
+        # or not the like (seeded or not) already exists
+        post_id = self._popular_post()
+        if post_id in self.liked:
+            self.liked.discard(post_id)
+            return self.request('DELETE', f'/api/likes/{post_id}', auth=True)
+        self.liked.add(post_id)
+        return self.request('PUT', f'/api/likes/{post_id}', auth=True)
+
+    def comment(self):
+        body = {'content': f'Benchmark comment {self.rng.random():.6f}', 'post_id': self._popular_post(),
+                'user_id': self.user_id}
+        return self.request('POST', '/api/comments', body, auth=True)
+
+    def login(self):
+        user_id = self.rng.randint(1, self.plan.users)
+        return self.request('POST', '/api/users/login', {'username': f'user{user_id}', 'password': SEED_PASSWORD})
+
+
+OPERATIONS = ('feed', 'post', 'like', 'comment', 'login')
+
+
+def parse_mix(value):
+    """Parse 'feed=35,post=35,...' into {operation: weight}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'Unknown operation {name!r}; choose from {", ".join(OPERATIONS)}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'Invalid weight for {name}: {weight!r}')
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError('The mix needs a positive weight')
+    return mix
+
+
+def _drive(clients, mix, total):
+    """Send total requests spread evenly over the clients, returning (records, wall seconds)"""
+    names, weights = list(mix), list(mix.values())
+    records = [[] for _ in clients]
+    start = threading.Barrier(len(clients) + 1)
+
+    def work(i, client, count):
+        start.wait()
+        for name in client.rng.choices(names, weights, k=count):
+            status, elapsed, queries, _ = getattr(client, name)()
+            records[i].append((name, status, elapsed, queries))
+
+    threads = [
+        threading.Thread(target=work, args=(i, client, total // len(clients) + (i < total % len(clients))))
+        for i, client in enumerate(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return [record for client_records in records for record in client_records], time.perf_counter() - began
+
+
+def _percentile(values, q):
+    # Nearest rank on sorted values
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+def _stats(records, wall):
+    latencies = sorted(elapsed * 1000 for _, _, elapsed, _ in records)
+    queries = [q for _, _, _, q in records if q is not None]
+    statuses = [status for _, status, _, _ in records]
+    return {
+        'requests': len(records),
+        'ok': sum(1 for s in statuses if s is not None and s < 400),
+        'client_errors': sum(1 for s in statuses if s is not None and 400 <= s < 500),
+        'server_errors': sum(1 for s in statuses if s is None or s >= 500),
+        'throughput_rps': round(len(records) / wall, 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'p50_ms': round(_percentile(latencies, 0.50), 3),
+        'p95_ms': round(_percentile(latencies, 0.95), 3),
+        'p99_ms': round(_percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'queries_per_request': round(sum(queries) / len(queries), 3) if queries else None,
+    }
+
+
+def summarize(records, wall):
+    """Overall and per-operation statistics of a run"""
+    by_operation = {}
+    for record in records:
+        by_operation.setdefault(record[0], []).append(record)
+    return {
+        'overall': _stats(records, wall),
+        'operations': {name: _stats(group, wall) for name, group in sorted(by_operation.items())},
+    }
+
+
+def compare(result, baseline, threshold):
+    """Print the change of each metric against a baseline, returning the regressions beyond threshold percent"""
+    regressions = []
+    scopes = [('overall', result['overall'], baseline.get('overall'))] + [
+        (name, stats, baseline.get('operations', {}).get(name)) for name, stats in result['operations'].items()
+    ]
+    print(f"\nAgainst baseline {baseline.get('meta', {}).get('commit') or '(unknown commit)'}:")
+    for scope, current, previous in scopes:
+        if previous is None:
+            continue
+        for metric in REPORTED:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            direction = GATED.get(metric)
+            gated = direction is not None and (scope == 'overall' or metric == 'queries_per_request')
+            regressed = gated and change * direction > threshold
+            if regressed:
+                regressions.append(f'{scope} {metric} {old} -> {new} ({change:+.1f}%)')
+            print(f"  {scope:<10} {metric:<20} {old:>10} -> {new:<10} {change:+7.1f}%{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def _serve(server):
+    # Not a daemon process, as the password hasher starts its own workers;
+    # stop on terminate() and wait for them, or the exit of this process
+    # can close their queue before they are told to stop
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        password_hasher.shutdown(wait=True)
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _reset_database():
+    # Drop everything, the SQLite full-text table included, so the run
+    # starts from exactly the seeded data
+    db.drop_all()
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
+        db.session.commit()
+
+
+def _print_table(result):
+    print(f"\n{'operation':<10} {'requests':>8} {'errors':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'queries':>7}")
+    rows = list(result['operations'].items()) + [('overall', result['overall'])]
+    for name, s in rows:
+        queries = '-' if s['queries_per_request'] is None else f"{s['queries_per_request']:.2f}"
+        print(f"{name:<10} {s['requests']:>8} {s['server_errors']:>6} {s['throughput_rps']:>9.1f} "
+              f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {queries:>7}")
+
+
+def benchmark(args):
+    """Seed the benchmark database, serve the app and drive the request mix"""
+    app = create_app('benchmark', schema_check=False)
+    plan = Plan(**{**DATASET, 'users': args.users, 'posts': args.posts,
+                   'comments': args.comments, 'likes': args.likes})
+    if args.users < args.concurrency:
+        sys.exit('Need at least as many users as clients')
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if args.no_seed:
+            print("Reusing the seeded benchmark database")
+        else:
+            _reset_database()
+            seed(plan, args.seed_workers)
+        # The server process opens its own connections
+        db.engine.dispose()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietHandler)
+    process = multiprocessing.get_context('fork').Process(target=_serve, args=(server,))
+    process.start()
+    server.socket.close()
+    clients = [Client(server.server_port, plan, i, DATASET['seed']) for i in range(args.concurrency)]
+    try:
+        for i, client in enumerate(clients):
+            # Each client logs in as its own user, skipping inactive ones
+            for user_id in range(i + 1, plan.users + 1, args.concurrency):
+                if client.authenticate(user_id):
+                    break
+            else:
+                sys.exit(f'No seeded user could log in for client {i}')
+        print(f"\nDriving {args.requests:,} requests ({args.warmup:,} warm-up) from {args.concurrency} clients...")
+        if args.warmup:
+            _drive(clients, args.mix, args.warmup)
+        records, wall = _drive(clients, args.mix, args.requests)
+    finally:
+        for client in clients:
+            client.conn.close()
+        process.terminate()
+        process.join()
+
+    result = {
+        'meta': {
+            'commit': _commit(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': dialect,
+        },
+        'config': {
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'mix': args.mix,
+            'dataset': {**{k: v for k, v in DATASET.items() if k != 'until'}, 'until': DATASET['until'].isoformat(),
+                        'users': plan.users, 'posts': plan.posts, 'comments': plan.comments, 'likes': plan.likes},
+        },
+        'wall_seconds': round(wall, 3),
+        **summarize(records, wall),
+    }
+    _print_table(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        print(f"\n✓ Wrote results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config', {}).get('dataset') != result['config']['dataset'] or \
+                baseline.get('config', {}).get('mix') != result['config']['mix']:
+            print("⚠ The baseline used a different data set or mix; the comparison is not like for like")
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) beyond {args.threshold}%:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\n✓ No regressions beyond {args.threshold}%")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the API against a seeded database')
+    parser.add_argument('--concurrency', type=int, default=8, help='simultaneous clients')
+    parser.add_argument('--requests', type=int, default=5000, help='measured requests')
+    parser.add_argument('--warmup', type=int, default=500, help='requests sent before measuring')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'operation weights (default {DEFAULT_MIX})')
+    parser.add_argument('--users', type=int, default=DATASET['users'])
+    parser.add_argument('--posts', type=int, default=DATASET['posts'])
+    parser.add_argument('--comments', type=int, default=DATASET['comments'])
+    parser.add_argument('--likes', type=int, default=DATASET['likes'])
+    parser.add_argument('--seed-workers', type=int, default=4, help='processes seeding the data set')
+    parser.add_argument('--no-seed', action='store_true',
+                        help='reuse the database of a previous run (its writes included)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent change for the worse in a gated metric that fails --compare')
+    args = parser.parse_args()
+    if args.concurrency < 1 or args.requests < 1:
+        parser.error('--concurrency and --requests must be positive')
+    benchmark(args)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Content export script
+Stream posts, comments or likes to newline-delimited JSON
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+from app import create_app
+from app.controllers import PostController, CommentController, LikeController
+
+EXPORTS = {
+    'posts': PostController.export_posts,
+    'comments': CommentController.export_comments,
+    'likes': LikeController.export_likes,
+}
+
+def export_data(table, since=None, output=None):
+    """Write every row of a table (changed at or after since) as NDJSON"""
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        out = open(output, 'w', encoding='utf-8') if output else sys.stdout
+        try:
+            count = 0
+            for line in EXPORTS[table](since):
+                out.write(line)
+                count += 1
+        finally:
+            if output:
+                out.close()
+        print(f"✓ Exported {count} {table}", file=sys.stderr)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export content as NDJSON')
+    parser.add_argument('table', choices=sorted(EXPORTS))
+    parser.add_argument('--since', type=datetime.fromisoformat,
+                        help='only rows updated at or after this ISO timestamp (incremental dumps)')
+    parser.add_argument('--output', help='file to write to (default: stdout)')
+    args = parser.parse_args()
+    export_data(args.table, args.since, args.output)
@@ -0,0 +1,13 @@
+"""
+Gunicorn settings
+Used automatically by: gunicorn wsgi:app
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+# Build the app once in the master and fork workers from it; wsgi.py
+# disposes the inherited database connections in each worker
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
@@ -5,20 +5,23 @@ Create and populate initial data
 """
 import os
 import sys
-from app import create_app
+from app import create_app, trending
 from app.models import db, User, Post, Comment, Category, Tag, Like
+from app.controllers import PostController
 from datetime import datetime
-from werkzeug.security import generate_password_hash
+from app.hashing import password_hasher
+from app.migrations import upgrade
+from app.search import rebuild_index
 
 def init_db():
     """Initialize database with sample data"""
-    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    app = create_app(os.getenv('FLASK_ENV', 'development'), schema_check=False)
     
     with app.app_context():
-        # Create tables
-        print("Creating database tables...")
-        db.create_all()
-        print("✓ Tables created successfully!")
+        # Create or migrate tables
+        print("Migrating database schema...")
+        upgrade()
+        print("✓ Schema is up to date!")
         
         # Check if data already exists
         if User.query.first() is not None:
@@ -28,9 +31,9 @@ def init_db():
         # Create sample users
         print("\nAdding sample users...")
         users = [
-            User(username='john', email='john@example.com', password=generate_password_hash('password123'), full_name='John Doe'),
-            User(username='jane', email='jane@example.com', password=generate_password_hash('password123'), full_name='Jane Smith'),
-            User(username='bob', email='bob@example.com', password=generate_password_hash('password123'), full_name='Bob Johnson'),
+            User(username='john', email='john@example.com', password=password_hasher.hash('password123'), full_name='John Doe'),
+            User(username='jane', email='jane@example.com', password=password_hasher.hash('password123'), full_name='Jane Smith'),
+            User(username='bob', email='bob@example.com', password=password_hasher.hash('password123'), full_name='Bob Johnson'),
         ]
         db.session.add_all(users)
         db.session.commit()
@@ -87,6 +90,8 @@ def init_db():
                 published_at=datetime.utcnow()
             ),
         ]
+        posts[0].tags = [tags[0], tags[1], tags[2]]
+        posts[1].tags = [tags[3]]
         db.session.add_all(posts)
         db.session.commit()
         print(f"✓ Added {len(posts)} posts")
@@ -113,6 +118,13 @@ def init_db():
         db.session.commit()
         print(f"✓ Added {len(likes)} likes")
         
+        # Sample rows bypass the controllers, so fill in the post counters
+        # the search index and the trending scores
+        PostController.recount_counters()
+        print("✓ Recounted post likes and comments")
+        print(f"✓ Indexed {rebuild_index()} posts for search")
+        print(f"✓ Scored {trending.rebuild()} posts for trending")
+        
         print("\n✓ Database initialization completed successfully!")
 
 if __name__ == '__main__':
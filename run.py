@@ -2,8 +2,15 @@ import os
 import sys
 from app import create_app
 from app.models import db, User, Post, Comment, Category, Tag, Like
+from app.controllers import PostController
+from app.search import rebuild_index
+from app import trending
+from app.purge import purger
+from app.migrations import upgrade, current_version, head, check_schema
 
-app = create_app(os.getenv('FLASK_ENV', 'development'))
+# The CLI must start against an outdated schema to migrate it; the
+# development server checks it below
+app = create_app(os.getenv('FLASK_ENV', 'development'), schema_check=False)
 
 @app.shell_context_processor
 def make_shell_context():
@@ -18,5 +25,50 @@ def make_shell_context():
         'Like': Like
     }
 
+@app.cli.command('db-upgrade')
+def db_upgrade():
+    """Apply pending schema migrations"""
+    applied = upgrade()
+    if applied:
+        print(f"✓ Migrated schema to version {applied[-1]} (applied {', '.join(map(str, applied))})")
+    else:
+        print(f"✓ Schema is up to date at version {head()}")
+
+@app.cli.command('db-version')
+def db_version():
+    """Show the schema version of the database and the one the code expects"""
+    print(f"Database: {current_version()}, expected: {head()}")
+
+@app.cli.command('recount-posts')
+def recount_posts():
+    """Recompute the denormalized like and comment counters on posts"""
+    updated = PostController.recount_counters()
+    print(f"✓ Recounted likes and comments for {updated} posts")
+
+@app.cli.command('rebuild-search')
+def rebuild_search():
+    """Rebuild the full-text search index over posts"""
+    indexed = rebuild_index()
+    print(f"✓ Rebuilt search index over {indexed} posts")
+
+@app.cli.command('decay-trending')
+def decay_trending():
+    """Apply time decay to trending scores (run periodically, e.g. from cron)"""
+    factor = trending.decay()
+    print(f"✓ Decayed trending scores by a factor of {factor:.4f}")
+
+@app.cli.command('rebuild-trending')
+def rebuild_trending():
+    """Recompute trending scores from recent likes and comments"""
+    scored = trending.rebuild()
+    print(f"✓ Rebuilt trending scores for {scored} posts")
+
+@app.cli.command('purge-deleted')
+def purge_deleted():
+    """Remove soft-deleted users and posts now, in bounded chunks"""
+    posts, users = purger.purge()
+    print(f"✓ Purged {posts} posts and {users} users")
+
 if __name__ == '__main__':
+    check_schema(app)
     app.run(debug=True)
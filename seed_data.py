@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+"""
+Synthetic data generator
+Fill an empty database with realistic data at load-testing scale
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+from sqlalchemy import create_engine, event
+from app import create_app, trending
+from app.models import db, User, Post, Comment, Category, Tag, Like, post_tags
+from app.controllers import PostController
+from app.hashing import password_hasher
+from app.migrations import upgrade
+from app.search import rebuild_index
+
+# Every row is a pure function of (seed, table, chunk number), so a run is
+# reproducible for a given --seed, --until and --chunk-size whatever the
+# number of workers. Ids are assigned here rather than by the database,
+# which lets chunks reference each other (a like names its post by id)
+# without reading anything back.
+#
+# Popularity is skewed: a post's rank r in [0, n) is drawn as n * u**skew
+# for uniform u, so with the default skew of 3 the top 1% of posts get
+# about a fifth of the likes and comments, and a few users write many of
+# the posts. Ranks are scattered over the id range so popular posts are
+# spread across time instead of all being the oldest.
+
+WORDS = (
+    'flask python api database server cache query index latency request response '
+    'travel beach mountain city food recipe pizza coffee music film book photo '
+    'design code deploy cloud mobile game sport health garden weekend family '
+    'the a of and to in is for on with that this from how why best new guide tips'
+).split()
+FIRST_NAMES = 'Ana Ben Chen Dewi Eko Fatima Gita Hiro Ivan Jane John Kofi Lina Maya Nora Omar Putri Raj Sara Tom'.split()
+LAST_NAMES = 'Doe Smith Johnson Wijaya Tanaka Kumar Garcia Okafor Nguyen Santoso Rossi Muller Silva Kim Haddad'.split()
+STATUSES = (('published', 0.9), ('draft', 0.07), ('archived', 0.03))
+SEED_PASSWORD = 'password123'
+
+
+class Plan:
+    """Sizes and shape of the data set to generate"""
+
+    def __init__(self, users=1000, posts=10000, comments=50000, likes=100000, categories=20, tags=200,
+                 skew=3.0, seed=42, days=365, until=None, chunk_size=10000):
+        self.seed = seed
+        self.users = users
+        self.posts = posts
+        self.comments = comments
+        self.likes = likes
+        self.categories = categories
+        self.tags = tags
+        self.skew = skew
+        self.chunk_size = chunk_size
+        self.until = until or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = self.until - timedelta(days=days)
+        self.password = None
+
+    def rng(self, table, chunk):
+        # Seeding with a string hashes it with SHA-512: stable across runs
+        return random.Random(f'{self.seed}:{table}:{chunk}')
+
+    def post_time(self, post_id):
+        """Creation time of a post; ids increase with time, as with autoincrement"""
+        return self.start + (self.until - self.start) * ((post_id - 1) / max(self.posts, 1))
+
+    def user_time(self, user_id):
+        # Users sign up over the first half of the period
+        return self.start + (self.until - self.start) * ((user_id - 1) / max(self.users, 1) / 2)
+
+    def after(self, rng, moment):
+        return moment + (self.until - moment) * rng.random()
+
+    def popular(self, rng, n):
+        """A 1-based id in [1, n], biased towards popular ones"""
+        rank = min(int(n * rng.random() ** self.skew), n - 1)
+        return _scatter(rank, n) + 1
+
+    def chunks(self, total):
+        return [(i, min(self.chunk_size, total - i)) for i in range(0, total, self.chunk_size)]
+
+
+def _scatter(rank, n):
+    # Multiplying by a step coprime with n permutes [0, n)
+    step = _STEPS.get(n)
+    if step is None:
+        step = int(n * 0.6180339887) | 1
+        while math.gcd(step, n) != 1:
+            step += 2
+        _STEPS[n] = step
+    return rank * step % n
+
+
+_STEPS = {}
+
+
+def _text(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _weighted(rng, choices):
+    u = rng.random()
+    for value, weight in choices:
+        u -= weight
+        if u < 0:
+            return value
+    return choices[-1][0]
+
+
+def generate_users(plan, chunk, offset, count):
+    rng = plan.rng('users', chunk)
+    rows = []
+    for user_id in range(offset + 1, offset + count + 1):
+        created = plan.user_time(user_id)
+        rows.append({
+            'id': user_id,
+            'username': f'user{user_id}',
+            'email': f'user{user_id}@example.com',
+            'password': plan.password,
+            'full_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'is_active': rng.random() < 0.98,
+            'created_at': created,
+            'updated_at': created,
+        })
+    return {User.__table__: rows}
+
+
+def generate_posts(plan, chunk, offset, count):
+    rng = plan.rng('posts', chunk)
+    rows, tag_rows = [], []
+    for post_id in range(offset + 1, offset + count + 1):
+        created = plan.post_time(post_id)
+        status = _weighted(rng, STATUSES)
+        rows.append({
+            'id': post_id,
+            'title': _text(rng, 3, 10).capitalize(),
+            'content': _text(rng, 20, 200),
+            'user_id': plan.popular(rng, plan.users),
+            'category_id': plan.popular(rng, plan.categories) if plan.categories and rng.random() < 0.9 else None,
+            'status': status,
+            'views_count': int(rng.paretovariate(1.2) * 10) - 10,
+            'likes_count': 0,
+            'comments_count': 0,
+            'created_at': created,
+            'updated_at': created,
+            'published_at': created if status == 'published' else None,
+        })
+        if plan.tags:
+            for tag_id in {plan.popular(rng, plan.tags) for _ in range(rng.randint(0, 3))}:
+                tag_rows.append({'post_id': post_id, 'tag_id': tag_id, 'status': status, 'created_at': created})
+    return {Post.__table__: rows, post_tags: tag_rows}
+
+
+def generate_comments(plan, chunk, offset, count):
+    rng = plan.rng('comments', chunk)
+    rows = []
+    for comment_id in range(offset + 1, offset + count + 1):
+        post_id = plan.popular(rng, plan.posts)
+        created = plan.after(rng, plan.post_time(post_id))
+        rows.append({
+            'id': comment_id,
+            'content': _text(rng, 3, 40),
+            'user_id': rng.randint(1, plan.users),
+            'post_id': post_id,
+            'is_approved': rng.random() < 0.95,
+            'created_at': created,
+            'updated_at': created,
+        })
+    return {Comment.__table__: rows}
+
+
+def generate_likes(plan, chunk, offset, count):
+    # Likes are unique per (user, post). Each chunk owns a slice of the
+    # users, so drawing without repeats inside the chunk is enough; a few
+    # draws collide and are dropped, so slightly fewer likes than asked for
+    # are inserted, more so for a small, very skewed data set
+    rng = plan.rng('likes', chunk)
+    first_user = offset * plan.users // plan.likes + 1
+    last_user = (offset + count) * plan.users // plan.likes
+    if last_user < first_user:
+        return {Like.__table__: []}
+    seen = set()
+    rows = []
+    for _ in range(count):
+        user_id = rng.randint(first_user, last_user)
+        post_id = plan.popular(rng, plan.posts)
+        if (user_id, post_id) in seen:
+            continue
+        seen.add((user_id, post_id))
+        rows.append({
+            'user_id': user_id,
+            'post_id': post_id,
+            'created_at': plan.after(rng, max(plan.post_time(post_id), plan.user_time(user_id))),
+        })
+    return {Like.__table__: rows}
+
+
+GENERATORS = {
+    'users': generate_users,
+    'posts': generate_posts,
+    'comments': generate_comments,
+    'likes': generate_likes,
+}
+
+_worker = {}
+
+
+def _init_worker(url, plan):
+    engine = create_engine(url)
+    dialect = engine.dialect.name
+
+    @event.listens_for(engine, 'connect')
+    def fast_load(dbapi_connection, connection_record):
+        # The data is generated consistent and unique, and a failed load is
+        # simply rerun on a fresh database, so skip the per-row checks
+        cursor = dbapi_connection.cursor()
+        if dialect == 'mysql':
+            cursor.execute('SET unique_checks = 0, foreign_key_checks = 0')
+        elif dialect == 'sqlite':
+            cursor.execute('PRAGMA synchronous = OFF')
+        cursor.close()
+
+    _worker['engine'] = engine
+    _worker['plan'] = plan
+
+
+def _insert_chunk(task):
+    table, chunk, offset, count = task
+    inserted = 0
+    with _worker['engine'].begin() as conn:
+        for target, rows in GENERATORS[table](_worker['plan'], chunk, offset, count).items():
+            if rows:
+                conn.execute(target.insert(), rows)
+                if target is not post_tags:
+                    inserted += len(rows)
+    return inserted
+
+
+def _run_phase(pool, plan, table, total):
+    tasks = [(table, n, offset, count) for n, (offset, count) in enumerate(plan.chunks(total))]
+    started = time.perf_counter()
+    inserted = 0
+    for done, count in enumerate(pool.imap_unordered(_insert_chunk, tasks), 1):
+        inserted += count
+        print(f"\r  {table}: {inserted:,} rows ({done}/{len(tasks)} chunks)", end='', file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    print(f"\r✓ Added {inserted:,} {table} in {elapsed:.1f}s ({inserted / max(elapsed, 1e-9):,.0f} rows/s)" + ' ' * 10)
+
+
+def seed(plan, workers=1):
+    """Insert the data set of a plan into the app's empty database.
+
+    Runs in an app context. Raises ValueError if the database already has
+    users or posts, or cannot be reached from worker processes.
+    """
+    upgrade()
+    if User.query.first() is not None or Post.query.first() is not None:
+        raise ValueError('Database already contains users or posts; seed an empty database')
+    url = db.engine.url
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            raise ValueError('Cannot seed an in-memory SQLite database from worker processes')
+        # SQLite takes one writer at a time
+        workers = 1
+
+    # Every user gets the same password, hashed once: hashing a million
+    # passwords at the configured cost would take hours
+    plan.password = password_hasher.hash(SEED_PASSWORD)
+
+    print(f"Seeding {plan.users:,} users, {plan.posts:,} posts, {plan.comments:,} comments "
+          f"and {plan.likes:,} likes with {workers} worker(s), seed {plan.seed}")
+    db.session.execute(db.insert(Category), [
+        {'id': i, 'name': f'Category {i}', 'slug': f'category-{i}', 'description': _text(plan.rng('categories', i), 5, 15)}
+        for i in range(1, plan.categories + 1)
+    ])
+    db.session.execute(db.insert(Tag), [
+        {'id': i, 'name': f'tag{i}', 'slug': f'tag{i}'} for i in range(1, plan.tags + 1)
+    ])
+    db.session.commit()
+    print(f"✓ Added {plan.categories} categories and {plan.tags} tags")
+    # Worker processes open their own connections
+    db.engine.dispose()
+    url_string = url.render_as_string(hide_password=False)
+
+    with Pool(workers, initializer=_init_worker, initargs=(url_string, plan)) as pool:
+        _run_phase(pool, plan, 'users', plan.users)
+        if plan.users:
+            _run_phase(pool, plan, 'posts', plan.posts)
+            if plan.posts:
+                _run_phase(pool, plan, 'comments', plan.comments)
+                _run_phase(pool, plan, 'likes', plan.likes)
+
+    # Rows were inserted behind the controllers' backs
+    print("Recounting post counters and rebuilding the search index and trending scores...")
+    PostController.recount_counters()
+    rebuild_index()
+    trending.rebuild()
+
+
+def seed_data(args):
+    """Generate users, categories, tags, posts, comments and likes"""
+    app = create_app(os.getenv('FLASK_ENV', 'development'), schema_check=False)
+    plan = Plan(
+        users=args.users, posts=args.posts, comments=args.comments, likes=args.likes,
+        categories=args.categories, tags=args.tags, skew=args.skew, seed=args.seed,
+        days=args.days, until=args.until, chunk_size=args.chunk_size
+    )
+
+    with app.app_context():
+        try:
+            seed(plan, args.workers)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"\n✓ Seeding completed; every user's password is '{SEED_PASSWORD}'")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill an empty database with synthetic data')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=50000)
+    parser.add_argument('--likes', type=int, default=100000)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--skew', type=float, default=3.0,
+                        help='popularity skew of authors, posts, categories and tags (1 is uniform)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed; same seed, same data')
+    parser.add_argument('--days', type=int, default=365, help='period the content is spread over')
+    parser.add_argument('--until', type=datetime.fromisoformat,
+                        help='end of that period (default: today, midnight UTC)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='insert processes (SQLite always uses one)')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='rows per insert transaction')
+    args = parser.parse_args()
+    if args.skew < 1:
+        parser.error('--skew must be at least 1')
+    seed_data(args)
@@ -0,0 +1,49 @@
+import os
+import pytest
+from app import create_app
+from app.models import db
+from config.config import config, TestingConfig
+
+
+def make_app(monkeypatch, schema_check=True, **settings):
+    """An app on the testing config with some settings overridden"""
+    monkeypatch.setitem(config, 'overridden', type('OverriddenConfig', (TestingConfig,), settings))
+    return create_app('overridden', schema_check=schema_check)
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture(params=['sqlite', 'mysql'])
+def any_db_app(request, monkeypatch):
+    """The app on SQLite, and on MySQL too when TEST_MYSQL_URL names a scratch database"""
+    if request.param == 'sqlite':
+        app = create_app('testing')
+    else:
+        url = os.getenv('TEST_MYSQL_URL')
+        if not url:
+            pytest.skip('TEST_MYSQL_URL is not set')
+        app = make_app(monkeypatch, SQLALCHEMY_DATABASE_URI=url)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        if request.param == 'mysql':
+            db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def login():
+    """Create a user (unless it exists) and return Authorization headers for them"""
+    def login(client, username='alice'):
+        client.post('/api/users', json={
+            'username': username, 'email': f'{username}@example.com', 'password': 'password123'
+        })
+        response = client.post('/api/users/login', json={'username': username, 'password': 'password123'})
+        return {'Authorization': f'Bearer {response.json["access_token"]}'}
+    return login
@@ -0,0 +1,54 @@
+import pytest
+from app import create_app
+from app.models import db
+
+
+@pytest.fixture
+def client():
+    app = create_app('testing')
+    client = app.test_client()
+    client.post('/api/users', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'password123'})
+    yield client
+    with app.app_context():
+        db.engine.dispose()
+
+
+def _login(client):
+    token = client.post('/api/users/login', json={'username': 'alice', 'password': 'password123'}).json['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_sub_requests_run_in_order_and_see_earlier_writes(client):
+    response = client.post('/api/batch', headers=_login(client), json={'requests': [
+        {'path': '/api/posts', 'method': 'POST', 'body': {'title': 'Hello', 'content': 'World'}},
+        {'path': '/api/posts/1'},
+        {'path': '/api/posts/99'},
+    ]})
+
+    assert response.status_code == 200
+    assert [r['status'] for r in response.json['responses']] == [201, 200, 404]
+    assert response.json['responses'][1]['body']['title'] == 'Hello'
+
+
+@pytest.mark.parametrize('path', ['/api/batch', '/api/batch?x=1', '/api/%62atch', '/api/b%61tch'])
+def test_batches_cannot_be_nested(client, path):
+    nested = {'requests': [{'path': '/api/health'}]}
+
+    response = client.post('/api/batch', json={'requests': [
+        {'path': '/api/health'},
+        {'path': path, 'method': 'POST', 'body': nested},
+    ]})
+
+    assert response.status_code == 400
+    assert 'cannot be nested' in response.json['error']
+
+
+def test_batch_view_refuses_to_run_as_a_sub_request(client):
+    # Even a route the guard does not catch cannot run a batch inside one
+    with client.application.test_request_context(
+        '/api/batch', method='POST', json={'requests': [{'path': '/api/health'}]},
+        environ_base={'sosmed.batch_sub_request': True}
+    ):
+        response = client.application.full_dispatch_request()
+
+    assert response.status_code == 400
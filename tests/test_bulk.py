@@ -0,0 +1,85 @@
+import pytest
+from app import controllers
+from app.models import db, Post
+
+
+@pytest.fixture
+def client(app, login):
+    client = app.test_client()
+    client.headers = login(client)
+    client.post('/api/categories', json={'name': 'News', 'slug': 'news'}, headers=client.headers)
+    return client
+
+
+def _post_titles(app):
+    with app.app_context():
+        return sorted(db.session.scalars(db.select(Post.title)))
+
+
+def test_invalid_items_fail_alone(app, client):
+    response = client.post('/api/posts/bulk', headers=client.headers, json=[
+        {'title': 'Valid', 'content': 'y'},
+        {'title': None, 'content': 'y'},
+        {'title': '  ', 'content': 'y'},
+        {'title': 'x', 'content': 'y', 'category_id': 'news'},
+        {'title': 'x', 'content': 'y', 'category_id': 99},
+        {'title': 'x'},
+        'not an object',
+        {'title': 'Also valid', 'content': 'y', 'category_id': 1},
+    ])
+
+    assert response.status_code == 207
+    results = response.json['results']
+    assert [r['status'] for r in results] == [201, 400, 400, 400, 404, 400, 400, 201]
+    assert results[1]['error'] == 'title is required'
+    assert results[3]['error'] == 'category_id must be an integer'
+    assert response.json['created'] == 2
+    assert _post_titles(app) == ['Also valid', 'Valid']
+
+
+def test_a_row_failing_in_the_database_does_not_fail_its_chunk(app, client, monkeypatch):
+    index_posts = controllers.index_posts
+
+    def failing_index_posts(rows):
+        if any(title == 'Boom' for _, title, _ in rows):
+            raise RuntimeError('secret database detail')
+        index_posts(rows)
+
+    monkeypatch.setattr(controllers, 'index_posts', failing_index_posts)
+
+    response = client.post('/api/posts/bulk', headers=client.headers, json=[
+        {'title': 'First', 'content': 'y'},
+        {'title': 'Boom', 'content': 'y'},
+        {'title': 'Third', 'content': 'y'},
+    ])
+
+    assert [r['status'] for r in response.json['results']] == [201, 500, 201]
+    assert response.json['results'][1]['error'] == 'Could not save this item'
+    assert 'secret' not in response.get_data(as_text=True)
+    assert _post_titles(app) == ['First', 'Third']
+
+
+def test_bulk_likes_and_comments_check_their_ids(client):
+    client.post('/api/posts', json={'title': 'Post', 'content': 'y'}, headers=client.headers)
+
+    likes = client.post('/api/likes/bulk', headers=client.headers, json=[
+        {'post_id': 1}, {'post_id': '1'}, {'post_id': 99}, {'post_id': 1},
+    ]).json['results']
+    comments = client.post('/api/comments/bulk', headers=client.headers, json=[
+        {'post_id': 1, 'content': 'Nice'}, {'post_id': 1, 'content': ''}, {'post_id': True, 'content': 'x'},
+    ]).json['results']
+
+    assert [r['status'] for r in likes] == [201, 400, 404, 400]
+    assert [r['status'] for r in comments] == [201, 400, 400]
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'title': None, 'content': 'y'}, 'title is required'),
+    ({'title': 'x', 'content': 'y', 'category_id': 'news'}, 'category_id must be an integer'),
+    ({'title': 'x', 'content': 'y', 'tag_ids': ['a']}, 'tag_ids must be a list of integers'),
+])
+def test_create_post_rejects_invalid_fields(client, body, error):
+    response = client.post('/api/posts', json=body, headers=client.headers)
+
+    assert response.status_code == 400
+    assert response.json['error'] == error
@@ -0,0 +1,52 @@
+import threading
+import pytest
+from app.cache import Cache, LRUBackend
+from app.view_counter import view_counter
+
+
+@pytest.fixture
+def client(app, login):
+    client = app.test_client()
+    client.headers = login(client)
+    client.post('/api/posts', json={'title': 'Post', 'content': 'y', 'status': 'published'}, headers=client.headers)
+    return client
+
+
+def test_renaming_the_author_invalidates_cached_posts(client):
+    assert client.get('/api/posts/1').json['author'] == 'alice'
+
+    client.put('/api/users/1', json={'username': 'renamed'}, headers=client.headers)
+
+    assert client.get('/api/posts/1').json['author'] == 'renamed'
+
+
+def test_flushed_views_are_counted_once(app, client):
+    view_counter.interval = 3600
+    try:
+        assert [client.get('/api/posts/1').json['views_count'] for _ in range(3)] == [1, 2, 3]
+        with app.app_context():
+            assert view_counter.flush() == 1
+        assert app.extensions['cache'].backend.get('post:1') is None
+        assert client.get('/api/posts/1').json['views_count'] == 4
+        assert client.get('/api/posts/1').json['views_count'] == 5
+    finally:
+        view_counter.interval = 0
+
+
+def test_hit_and_miss_counters_are_exact_under_threads():
+    cache = Cache()
+    cache.backend = LRUBackend()
+    cache.set('hit', 1)
+
+    def lookups():
+        for _ in range(2000):
+            cache.get('hit')
+            cache.get('miss')
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (16000, 16000)
@@ -0,0 +1,47 @@
+import pytest
+
+
+@pytest.fixture
+def client(app, login):
+    client = app.test_client()
+    client.headers = login(client)
+    client.post('/api/posts', json={'title': 'Post', 'content': 'y', 'status': 'published'}, headers=client.headers)
+    client.post('/api/comments', json={'post_id': 1, 'content': 'Nice'}, headers=client.headers)
+    return client
+
+
+def test_unchanged_resource_is_not_modified(client):
+    first = client.get('/api/users/1')
+
+    again = client.get('/api/users/1', headers={'If-None-Match': first.headers['ETag']})
+    since = client.get('/api/users/1', headers={'If-Modified-Since': first.headers['Last-Modified']})
+
+    assert again.status_code == 304 and again.get_data() == b''
+    assert since.status_code == 304
+
+
+def test_renaming_the_author_changes_a_cached_comment(client):
+    first = client.get('/api/comments/1')
+    assert 'Last-Modified' not in first.headers
+
+    client.put('/api/users/1', json={'username': 'renamed'}, headers=client.headers)
+    response = client.get('/api/comments/1', headers={'If-None-Match': first.headers['ETag']})
+
+    assert response.status_code == 200
+    assert response.json['author'] == 'renamed'
+
+
+def test_post_views_are_counted_on_304(client):
+    first = client.get('/api/posts/1')
+
+    assert client.get('/api/posts/1', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert client.get('/api/posts/1').json['views_count'] == first.json['views_count'] + 2
+
+
+def test_lists_only_honour_if_none_match(client):
+    first = client.get('/api/posts')
+    assert 'Last-Modified' not in first.headers
+
+    client.post('/api/posts', json={'title': 'Other', 'content': 'y', 'status': 'published'}, headers=client.headers)
+
+    assert client.get('/api/posts', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import event
+from app.models import db
+
+
+@pytest.fixture
+def client(app, login):
+    client = app.test_client()
+    client.headers = login(client)
+    client.post('/api/categories', json={'name': 'News', 'slug': 'news'}, headers=client.headers)
+    client.post('/api/tags', json={'name': 'Flask', 'slug': 'flask'}, headers=client.headers)
+    client.post('/api/tags', json={'name': 'Other', 'slug': 'other'}, headers=client.headers)
+    for i in range(5):
+        client.post('/api/posts', json={
+            'title': f'Post {i}', 'content': 'y', 'status': 'published', 'category_id': 1, 'tag_ids': [1]
+        }, headers=client.headers)
+    client.post('/api/posts', json={'title': 'Draft', 'content': 'y', 'tag_ids': [1]}, headers=client.headers)
+    client.post('/api/posts', json={'title': 'Untagged', 'content': 'y', 'status': 'published'}, headers=client.headers)
+    return client
+
+
+def _titles(client, path):
+    titles, cursor = [], ''
+    while cursor is not None:
+        page = client.get(f'{path}?per_page=2&cursor={cursor}').json
+        titles += [p['title'] for p in page['posts']]
+        cursor = page['next_cursor']
+    return titles
+
+
+def test_tag_feed_pages_newest_first(client):
+    assert _titles(client, '/api/tags/1/posts') == [f'Post {i}' for i in reversed(range(5))]
+    assert _titles(client, '/api/tags/2/posts') == []
+
+
+def test_tag_feed_follows_status_and_tag_changes(client):
+    client.put('/api/posts/6', json={'status': 'published'}, headers=client.headers)
+    client.put('/api/posts/5', json={'tag_ids': [2]}, headers=client.headers)
+    client.put('/api/posts/4', json={'status': 'archived'}, headers=client.headers)
+
+    assert _titles(client, '/api/tags/1/posts') == ['Draft', 'Post 2', 'Post 1', 'Post 0']
+    assert _titles(client, '/api/tags/2/posts') == ['Post 4']
+
+
+def _feed_plan(app, client, path):
+    """EXPLAIN QUERY PLAN of the statement loading a feed's posts"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM posts' in statement and 'LIMIT' in statement:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            cursor = client.get(path, query_string={'per_page': 2}).json['next_cursor']
+            assert client.get(path, query_string={'per_page': 2, 'cursor': cursor}).status_code == 200
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        statement, parameters = statements[-1]
+        rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [row[-1] for row in rows]
+
+
+@pytest.mark.parametrize('path, index', [
+    ('/api/tags/1/posts', 'ix_post_tags_tag_status_created_at_post'),
+    ('/api/categories/1/posts', 'ix_posts_category_status_created_at_id'),
+])
+def test_feeds_are_read_in_index_order(app, client, path, index):
+    plan = _feed_plan(app, client, path)
+
+    assert any(index in step for step in plan), plan
+    assert not any(step.startswith('SCAN') or 'TEMP B-TREE' in step for step in plan), plan
@@ -0,0 +1,28 @@
+import pytest
+from tests.conftest import make_app
+from app.hashing import password_hasher
+
+
+@pytest.mark.parametrize('method, stored', [
+    ('scrypt', 'scrypt:32768:8:1'),
+    ('scrypt:16384', 'scrypt:16384:8:1'),
+    ('scrypt:16384:4', 'scrypt:16384:4:1'),
+    ('scrypt:16384:4:2', 'scrypt:16384:4:2'),
+    ('pbkdf2:sha256:1000', 'pbkdf2:sha256:1000'),
+])
+def test_fresh_hashes_do_not_need_rehashing(monkeypatch, method, stored):
+    make_app(monkeypatch, PASSWORD_HASH_METHOD=method)
+
+    pwhash = password_hasher.hash('password123')
+
+    assert pwhash.startswith(stored + '$')
+    assert not password_hasher.needs_rehash(pwhash)
+    assert password_hasher.verify(pwhash, 'password123')
+
+
+def test_hashes_made_with_other_parameters_need_rehashing(monkeypatch):
+    make_app(monkeypatch, PASSWORD_HASH_METHOD='scrypt:16384')
+    old = password_hasher.hash('password123')
+    make_app(monkeypatch, PASSWORD_HASH_METHOD='scrypt:16384:8:2')
+
+    assert password_hasher.needs_rehash(old)
@@ -0,0 +1,105 @@
+import random
+import pytest
+from app.likes import like_queue
+from app.models import db, Like, Post, PostScore
+
+
+@pytest.fixture
+def app(any_db_app):
+    return any_db_app
+
+
+@pytest.fixture
+def client(app, login):
+    client = app.test_client()
+    headers = login(client)
+    for i in range(3):
+        client.post('/api/posts', json={'title': f'Post {i}', 'content': 'x', 'status': 'published'}, headers=headers)
+    return client
+
+
+def _counters(app):
+    """{post_id: (likes_count, likes actually stored)}"""
+    with app.app_context():
+        stored = {post_id: n for post_id, n in db.session.execute(
+            db.select(Like.post_id, db.func.count(Like.id)).group_by(Like.post_id)
+        )}
+        return {post.id: (post.likes_count, stored.get(post.id, 0)) for post in Post.query}
+
+
+def _score(app, post_id):
+    with app.app_context():
+        return db.session.scalar(db.select(PostScore.score).where(PostScore.post_id == post_id)) or 0
+
+
+def test_put_like_is_idempotent(app, client, login):
+    headers = login(client)
+
+    assert client.put('/api/likes/1', headers=headers).status_code == 201
+    assert client.put('/api/likes/1', headers=headers).status_code == 200
+    assert client.put('/api/likes/1', headers=headers).status_code == 200
+
+    assert _counters(app)[1] == (1, 1)
+    assert _score(app, 1) == app.config['TRENDING_LIKE_WEIGHT']
+
+
+def test_delete_like_is_idempotent(app, client, login):
+    headers = login(client)
+    client.put('/api/likes/1', headers=headers)
+
+    assert client.delete('/api/likes/1', headers=headers).status_code == 200
+    assert client.delete('/api/likes/1', headers=headers).status_code == 200
+
+    assert _counters(app)[1] == (0, 0)
+    assert _score(app, 1) == 0
+
+
+def test_post_like_rejects_a_second_like(app, client, login):
+    headers = login(client)
+
+    assert client.post('/api/likes', json={'post_id': 2}, headers=headers).status_code == 201
+    assert client.post('/api/likes', json={'post_id': 2}, headers=headers).status_code == 400
+    assert client.delete('/api/likes', json={'post_id': 2}, headers=headers).status_code == 200
+    assert client.delete('/api/likes', json={'post_id': 2}, headers=headers).status_code == 404
+
+    assert _counters(app)[2] == (0, 0)
+
+
+def test_liking_a_missing_or_deleted_post_is_404(app, client, login):
+    headers = login(client)
+    client.delete('/api/posts/3', headers=headers)
+
+    assert client.put('/api/likes/99', headers=headers).status_code == 404
+    assert client.put('/api/likes/3', headers=headers).status_code == 404
+    assert client.post('/api/likes', json={'post_id': 99}, headers=headers).status_code == 404
+
+
+def test_counters_do_not_drift_under_repeated_toggles(app, client, login):
+    users = [login(client, f'user{i}') for i in range(4)]
+    rng = random.Random(7)
+
+    for _ in range(120):
+        headers = rng.choice(users)
+        post_id = rng.randint(1, 3)
+        method = rng.choice([client.put, client.delete])
+        assert method(f'/api/likes/{post_id}', headers=headers).status_code in (200, 201)
+
+    for post_id, (likes_count, stored) in _counters(app).items():
+        assert likes_count == stored, post_id
+
+
+def test_queued_toggles_coalesce_to_the_last(app, client, login):
+    headers = login(client)
+    like_queue.interval = 3600
+    try:
+        for method in (client.put, client.delete, client.put, client.put):
+            assert method('/api/likes/1', headers=headers).status_code == 202
+        assert method('/api/likes/2', headers=headers).status_code == 202
+        with app.app_context():
+            assert like_queue.flush() == 2
+    finally:
+        like_queue.interval = 0
+
+    counters = _counters(app)
+    assert counters[1] == (1, 1)
+    assert counters[2] == (1, 1)
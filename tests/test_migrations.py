@@ -0,0 +1,107 @@
+import sqlite3
+import pytest
+from app.migrations import SchemaOutdated, current_version, head, upgrade
+from app.models import db, User, Post, Comment, Like, post_tags
+from tests.conftest import make_app
+
+# The schema as created by db.create_all() before versioning (version 1)
+BASELINE_SCHEMA = '''
+CREATE TABLE users (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, email VARCHAR(120) NOT NULL,
+    password VARCHAR(255) NOT NULL, full_name VARCHAR(120), profile_picture VARCHAR(255),
+    is_active BOOLEAN, created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE TABLE categories (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, description TEXT, slug VARCHAR(100) NOT NULL,
+    created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id), UNIQUE (name)
+);
+CREATE UNIQUE INDEX ix_categories_slug ON categories (slug);
+CREATE TABLE tags (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, slug VARCHAR(100) NOT NULL,
+    created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id), UNIQUE (name)
+);
+CREATE UNIQUE INDEX ix_tags_slug ON tags (slug);
+CREATE TABLE posts (
+    id INTEGER NOT NULL, title VARCHAR(255) NOT NULL, content TEXT NOT NULL, user_id INTEGER NOT NULL,
+    category_id INTEGER, status VARCHAR(50), views_count INTEGER, created_at DATETIME, updated_at DATETIME,
+    published_at DATETIME, PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(category_id) REFERENCES categories (id)
+);
+CREATE INDEX ix_posts_title ON posts (title);
+CREATE INDEX ix_posts_created_at ON posts (created_at);
+CREATE TABLE comments (
+    id INTEGER NOT NULL, content TEXT NOT NULL, user_id INTEGER NOT NULL, post_id INTEGER NOT NULL,
+    is_approved BOOLEAN, created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(post_id) REFERENCES posts (id)
+);
+CREATE TABLE likes (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, post_id INTEGER NOT NULL, created_at DATETIME,
+    PRIMARY KEY (id), CONSTRAINT unique_user_post_like UNIQUE (user_id, post_id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(post_id) REFERENCES posts (id)
+);
+CREATE TABLE post_tags (
+    post_id INTEGER NOT NULL, tag_id INTEGER NOT NULL, PRIMARY KEY (post_id, tag_id),
+    FOREIGN KEY(post_id) REFERENCES posts (id), FOREIGN KEY(tag_id) REFERENCES tags (id)
+);
+'''
+
+BASELINE_ROWS = '''
+INSERT INTO users (id, username, email, password, created_at, updated_at) VALUES
+    (1, 'alice', 'alice@example.com', 'x', '2024-01-01 00:00:00', '2024-01-01 00:00:00'),
+    (2, 'bob', 'bob@example.com', 'x', '2024-01-01 00:00:00', '2024-01-01 00:00:00');
+INSERT INTO tags (id, name, slug) VALUES (1, 'Flask', 'flask');
+INSERT INTO posts (id, title, content, user_id, status, views_count, created_at, updated_at) VALUES
+    (1, 'Hello migrations', 'First post', 1, 'published', 3, '2024-01-02 00:00:00', '2024-01-02 00:00:00'),
+    (2, 'Second', 'By bob', 2, 'draft', 0, '2024-01-03 00:00:00', '2024-01-03 00:00:00');
+INSERT INTO comments (id, content, user_id, post_id, is_approved, created_at, updated_at) VALUES
+    (1, 'Nice', 2, 1, 1, '2024-01-02 01:00:00', '2024-01-02 01:00:00'),
+    (2, 'Hidden', 2, 1, 0, '2024-01-02 02:00:00', '2024-01-02 02:00:00');
+INSERT INTO likes (id, user_id, post_id, created_at) VALUES (1, 2, 1, '2024-01-02 03:00:00');
+INSERT INTO post_tags (post_id, tag_id) VALUES (1, 1), (2, 1);
+'''
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    path = tmp_path / 'baseline.db'
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript(BASELINE_SCHEMA + BASELINE_ROWS)
+    conn.close()
+    return f'sqlite:///{path}'
+
+
+def test_startup_refuses_an_unversioned_database(monkeypatch, baseline_db):
+    with pytest.raises(SchemaOutdated):
+        make_app(monkeypatch, SQLALCHEMY_DATABASE_URI=baseline_db, SCHEMA_AUTO_UPGRADE=False)
+
+
+def test_baseline_database_upgrades_to_head(monkeypatch, baseline_db):
+    app = make_app(monkeypatch, schema_check=False, SQLALCHEMY_DATABASE_URI=baseline_db, SCHEMA_AUTO_UPGRADE=False)
+    try:
+        with app.app_context():
+            assert current_version() is None
+            assert upgrade() == list(range(2, head() + 1))
+            assert current_version() == head()
+            assert upgrade() == []
+
+            # Counters are backfilled, approved comments only
+            post = db.session.get(Post, 1)
+            assert (post.views_count, post.likes_count, post.comments_count) == (3, 1, 1)
+            # The tag feed's copies of status and created_at are filled in
+            links = db.session.execute(db.select(post_tags).order_by(post_tags.c.post_id)).all()
+            assert [(link.status, link.created_at.day) for link in links] == [('published', 2), ('draft', 3)]
+            # Foreign keys now cascade
+            db.session.execute(db.delete(User).where(User.id == 2))
+            db.session.commit()
+            assert db.session.scalar(db.select(db.func.count(Comment.id))) == 0
+            assert db.session.scalar(db.select(db.func.count(Like.id))) == 0
+
+        client = app.test_client()
+        assert client.get('/api/tags/1/posts').json['posts'][0]['title'] == 'Hello migrations'
+        assert [p['id'] for p in client.get('/api/posts/search?q=migrations').json['posts']] == [1]
+    finally:
+        with app.app_context():
+            db.engine.dispose()
@@ -0,0 +1,88 @@
+import base64
+from datetime import datetime, timedelta
+import pytest
+from app.models import db, Post, Comment
+
+
+@pytest.fixture
+def client(app, login):
+    """Seven published posts, the middle three created at the same instant, and 13 comments on post 1"""
+    client = app.test_client()
+    client.headers = login(client)
+    start = datetime(2024, 1, 1)
+    created = [start, start + timedelta(hours=1), *[start + timedelta(hours=2)] * 3, start + timedelta(hours=3),
+               start + timedelta(hours=4)]
+    with app.app_context():
+        db.session.add_all(
+            Post(title=f'Post {i}', content='y', user_id=1, status='published', created_at=at)
+            for i, at in enumerate(created, 1)
+        )
+        db.session.add_all(
+            Comment(content=f'Comment {i}', user_id=1, post_id=1, created_at=start + timedelta(minutes=i))
+            for i in range(1, 14)
+        )
+        db.session.commit()
+    return client
+
+
+def _walk(client, path, key, per_page):
+    items, cursor, pages = [], '', 0
+    while cursor is not None:
+        page = client.get(path, query_string={'per_page': per_page, 'cursor': cursor})
+        assert page.status_code == 200
+        assert len(page.json[key]) <= per_page
+        items += page.json[key]
+        cursor = page.json['next_cursor']
+        pages += 1
+    return items, pages
+
+
+@pytest.mark.parametrize('per_page', [1, 2, 3, 7, 50])
+def test_pages_cover_every_post_once_newest_first(client, per_page):
+    posts, pages = _walk(client, '/api/posts', 'posts', per_page)
+
+    # Ties on created_at fall back to the id, newest first
+    assert [p['id'] for p in posts] == [7, 6, 5, 4, 3, 2, 1]
+    assert pages == max(1, -(-7 // per_page))
+
+
+def test_comment_pages_continue_from_the_post_detail(app, client):
+    post = client.get('/api/posts/1').json
+    embedded = post['comments']
+    rest, _ = _walk(client, '/api/comments/post/1', 'comments', 4)
+
+    assert len(embedded) == app.config['POST_DETAIL_COMMENTS']
+    assert [c['content'] for c in embedded] == [f'Comment {i}' for i in range(13, 3, -1)]
+    remaining = client.get('/api/comments/post/1', query_string={'cursor': post['comments_next_cursor']}).json
+    assert [c['content'] for c in remaining['comments']] == ['Comment 3', 'Comment 2', 'Comment 1']
+    assert remaining['next_cursor'] is None
+    assert [c['content'] for c in rest][10:] == ['Comment 3', 'Comment 2', 'Comment 1']
+
+
+@pytest.mark.parametrize('path', ['/api/posts', '/api/users', '/api/comments/post/1', '/api/likes/post/1',
+                                  '/api/categories/1/posts', '/api/tags/1/posts'])
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    base64.urlsafe_b64encode(b'[]').decode(),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+])
+def test_malformed_cursors_are_rejected(client, path, cursor):
+    client.post('/api/categories', json={'name': 'News', 'slug': 'news'}, headers=client.headers)
+    client.post('/api/tags', json={'name': 'Flask', 'slug': 'flask'}, headers=client.headers)
+
+    response = client.get(path, query_string={'cursor': cursor})
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid cursor'
+
+
+@pytest.mark.parametrize('per_page', [0, -1])
+def test_per_page_below_one_is_rejected(client, per_page):
+    assert client.get('/api/posts', query_string={'per_page': per_page, 'cursor': ''}).status_code == 400
+
+
+def test_per_page_is_capped(app, client):
+    app.config['MAX_PER_PAGE'] = 3
+
+    assert len(client.get('/api/posts', query_string={'per_page': 1000, 'cursor': ''}).json['posts']) == 3
+
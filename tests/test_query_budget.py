@@ -0,0 +1,54 @@
+import pytest
+from app import create_app
+from app.models import db
+from app.query_inspector import QueryBudgetExceeded, query_budget
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+
+    @app.route('/over-budget')
+    @query_budget(1)
+    def over_budget():
+        db.session.execute(db.text('SELECT 1'))
+        db.session.execute(db.text('SELECT 2'))
+        return {}
+
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/api/users', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'password123'})
+    token = client.post('/api/users/login', json={'username': 'alice', 'password': 'password123'}).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/categories', json={'name': 'News', 'slug': 'news'}, headers=headers)
+    client.post('/api/tags', json={'name': 'Flask', 'slug': 'flask'}, headers=headers)
+    for i in range(3):
+        post = client.post('/api/posts', json={
+            'title': f'Post {i}', 'content': 'Flask', 'status': 'published', 'category_id': 1, 'tag_ids': [1]
+        }, headers=headers).json
+        client.post('/api/comments', json={'post_id': post['id'], 'content': 'Nice'}, headers=headers)
+        client.put(f'/api/likes/{post["id"]}', headers=headers)
+    return client
+
+
+def test_exceeding_the_budget_fails_under_testing(app):
+    with pytest.raises(QueryBudgetExceeded, match='ran 2 SQL statements, over its budget of 1'):
+        app.test_client().get('/over-budget')
+
+
+@pytest.mark.parametrize('path', [
+    '/api/users', '/api/users/1', '/api/users?ids=1,2',
+    '/api/posts', '/api/posts?cursor=', '/api/posts/1', '/api/posts?ids=1,2,3',
+    '/api/comments/post/1', '/api/comments/1', '/api/comments?ids=1,2',
+    '/api/categories', '/api/categories/1', '/api/categories/1/posts',
+    '/api/tags', '/api/tags/1', '/api/tags/1/posts',
+    '/api/likes/post/1',
+])
+def test_read_endpoints_stay_within_their_budget(client, path):
+    assert client.get(path).status_code == 200
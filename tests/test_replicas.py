@@ -0,0 +1,118 @@
+import shutil
+import sqlite3
+import pytest
+from app import create_app
+from app.models import db, User
+from app.hashing import password_hasher
+from app.replicas import STICKY_COOKIE
+from config.config import config, TestingConfig
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app over two SQLite files, the replica a copy of the primary whose user is renamed"""
+    primary = tmp_path / 'primary.db'
+    replica = tmp_path / 'replica.db'
+
+    class ReplicatedConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{primary}'
+        SQLALCHEMY_BINDS = {'replica_0': f'sqlite:///{replica}'}
+        REPLICA_STICKY_SECONDS = 5
+        CACHE_TYPE = 'null'
+
+    monkeypatch.setitem(config, 'replicated', ReplicatedConfig)
+    app = create_app('replicated')
+    with app.app_context():
+        db.session.add(User(
+            username='alice', email='alice@example.com', full_name='On the primary',
+            password=password_hasher.hash('password123')
+        ))
+        db.session.commit()
+        for engine in db.engines.values():
+            engine.dispose()
+    shutil.copy(primary, replica)
+    # Stand-in for replication lag: the replica shows a different name
+    conn = sqlite3.connect(replica)
+    with conn:
+        conn.execute("UPDATE users SET full_name = 'On the replica'")
+    conn.close()
+
+    app.primary_path = primary
+    app.replica_path = replica
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    # init_app registered the bind's metadata on the shared db; later apps
+    # have no such bind and would fail to create its tables
+    db.metadatas.pop('replica_0', None)
+
+
+def _login(client):
+    response = client.post('/api/users/login', json={'username': 'alice', 'password': 'password123'})
+    assert response.status_code == 200
+    # Logging in is itself a write; start without its sticky cookie
+    client.delete_cookie(STICKY_COOKIE)
+    return {'Authorization': f'Bearer {response.json["access_token"]}'}
+
+
+def _count_posts(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_reads_go_to_the_replica(app):
+    response = app.test_client().get('/api/users/1')
+
+    assert response.status_code == 200
+    assert response.json['full_name'] == 'On the replica'
+
+
+def test_writes_go_to_the_primary(app):
+    client = app.test_client()
+    headers = _login(client)
+
+    response = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=headers)
+
+    assert response.status_code == 201
+    assert _count_posts(app.primary_path) == 1
+    assert _count_posts(app.replica_path) == 0
+
+
+def test_reads_after_a_write_go_to_the_primary(app):
+    client = app.test_client()
+    headers = _login(client)
+    assert client.get('/api/users/1').json['full_name'] == 'On the replica'
+
+    response = client.put('/api/users/1', json={'full_name': 'Renamed'}, headers=headers)
+
+    assert response.status_code == 200
+    assert client.get_cookie(STICKY_COOKIE) is not None
+    assert client.get('/api/users/1').json['full_name'] == 'Renamed'
+    # Other clients keep reading the (lagging) replica
+    assert app.test_client().get('/api/users/1').json['full_name'] == 'On the replica'
+
+
+def test_an_unreachable_replica_falls_back_to_the_primary(app):
+    app.replica_path.unlink()
+    # SQLite cannot open a directory as a database
+    app.replica_path.mkdir()
+
+    response = app.test_client().get('/api/users/1')
+
+    assert response.status_code == 200
+    assert response.json['full_name'] == 'On the primary'
+
+
+def test_checkouts_are_timed_per_bind(app):
+    client = app.test_client()
+    client.get('/api/users/1')
+    client.post('/api/users/login', json={'username': 'alice', 'password': 'password123'})
+
+    metrics = client.get('/api/metrics').get_data(as_text=True)
+
+    assert 'db_pool_checkout_seconds_count{bind="replica_0"}' in metrics
+    assert 'db_pool_checkout_seconds_count{bind="primary"}' in metrics
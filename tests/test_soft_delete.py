@@ -0,0 +1,88 @@
+import pytest
+from app.models import db, User, Post, Comment, Like
+from app.purge import purger
+from tests.conftest import make_app
+
+
+@pytest.fixture(params=[True, False], ids=['soft', 'hard'])
+def app(request, monkeypatch):
+    app = make_app(monkeypatch, SOFT_DELETE=request.param)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app, login):
+    """bob has post 1, with alice's comment and like; alice has post 2 with bob's comment and like"""
+    client = app.test_client()
+    client.alice, client.bob = login(client, 'alice'), login(client, 'bob')
+    client.post('/api/posts', json={'title': 'Bob', 'content': 'y', 'status': 'published'}, headers=client.bob)
+    client.post('/api/posts', json={'title': 'Alice', 'content': 'y', 'status': 'published'}, headers=client.alice)
+    client.post('/api/comments', json={'post_id': 1, 'content': 'From alice'}, headers=client.alice)
+    client.post('/api/comments', json={'post_id': 2, 'content': 'From bob'}, headers=client.bob)
+    client.put('/api/likes/1', headers=client.alice)
+    client.put('/api/likes/2', headers=client.bob)
+    # Fill the caches the delete has to invalidate
+    for path in ('/api/posts/1', '/api/posts/2', '/api/comments/1', '/api/users/1'):
+        client.get(path)
+    return client
+
+
+def _assert_alice_gone(client):
+    post = client.get('/api/posts/1').json
+    assert [c['content'] for c in post['comments']] == []
+    assert post['comments_count'] == 0
+    assert client.get('/api/comments/1').status_code == 404
+    assert client.get('/api/comments/post/1').json['comments'] == []
+    assert client.get('/api/posts/2').status_code == 404
+    assert client.get('/api/users/1').status_code == 404
+    assert [p['title'] for p in client.get('/api/posts').json['posts']] == ['Bob']
+    assert client.get('/api/posts/search?q=Alice').json['posts'] == []
+
+
+def test_deleted_user_disappears_at_once(app, client, monkeypatch):
+    # Leave the rows in place, as a purge job that has not run yet would
+    monkeypatch.setattr(purger, 'schedule', lambda: None)
+
+    assert client.delete('/api/users/1', headers=client.alice).status_code == 200
+
+    _assert_alice_gone(client)
+
+
+def test_purge_removes_the_rows_and_fixes_the_counters(app, client, monkeypatch):
+    monkeypatch.setattr(purger, 'schedule', lambda: None)
+    client.delete('/api/users/1', headers=client.alice)
+
+    with app.app_context():
+        purger.purge()
+        assert db.session.get(User, 1) is None
+        assert db.session.scalars(db.select(Post.id).execution_options(include_deleted=True)).all() == [1]
+        assert db.session.scalars(db.select(Comment.user_id).execution_options(include_deleted=True)).all() == []
+        assert db.session.scalars(db.select(Like.user_id)).all() == []
+        post = db.session.get(Post, 1)
+        assert (post.likes_count, post.comments_count) == (0, 0)
+
+    _assert_alice_gone(client)
+    assert client.get('/api/posts/1').json['likes_count'] == 0
+
+
+def test_deleted_users_tokens_are_rejected(app, client):
+    client.delete('/api/users/1', headers=client.alice)
+
+    response = client.post('/api/posts', json={'title': 'Ghost', 'content': 'y'}, headers=client.alice)
+
+    assert response.status_code == 401
+    assert client.post('/api/posts', json={'title': 'Still here', 'content': 'y'}, headers=client.bob).status_code == 201
+
+
+def test_revoked_users_are_synced_from_the_database(app, client):
+    jwt_auth = app.extensions['jwt_auth']
+    client.delete('/api/users/1', headers=client.alice)
+
+    # As seen from another process
+    jwt_auth._revoked_users.clear()
+    jwt_auth._synced_at = None
+
+    assert client.get('/api/users/2', headers=client.alice).status_code == 200
+    assert client.put('/api/likes/1', headers=client.alice).status_code == 401
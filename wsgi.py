@@ -0,0 +1,21 @@
+"""
+WSGI entry point
+Serve with: gunicorn wsgi:app (settings in gunicorn.conf.py)
+"""
+import os
+from app import create_app
+from app.models import db
+
+# Built once; with --preload this happens in the gunicorn master and the
+# workers are forked from it, so they start without importing or checking
+# anything
+app = create_app(os.getenv('FLASK_ENV', 'production'))
+
+def _dispose_engines():
+    """Drop pooled connections inherited from the parent, leaving its sockets open"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+# Forked workers must not share database sockets with the master
+os.register_at_fork(after_in_child=_dispose_engines)